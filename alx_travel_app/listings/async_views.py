@@ -0,0 +1,365 @@
+"""
+Async-native read and payment views for ASGI deployments.
+
+They serve the same JSON bodies as the DRF routes under `/api/async/`,
+and honour `?fields=`, `?omit=` and, on listings, `?expand=bookings`.
+Lists are cursor-paginated into `{next, previous, results}` pages like
+the DRF listing and review routes; the booking list is paginated the
+same way, where its DRF counterpart returns every booking at once.
+Reads go through Django's async ORM and payments await the Chapa
+gateway with `AsyncChapaClient`, so under an ASGI server a request
+that waits on the provider does not hold a worker thread. DRF views
+are sync-only and would each be run through a thread.
+Writes that need a transaction, and the cache round trips of the
+throttles, still run in a thread via `sync_to_async`.
+"""
+import base64
+import json
+import math
+import uuid
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, NotAuthenticated, PermissionDenied, Throttled, ValidationError
+from .authentication import ClaimsJWTAuthentication
+from .chapa import get_async_client, transaction_status, ChapaUnavailable, ChapaBadResponse
+from .fieldsets import parse_fieldset
+from .metrics import PAYMENT_INITIATIONS, PAYMENT_VERIFICATIONS
+from .models import Booking, Listing, Payment
+from .renderers import ORJSONRenderer
+from .serializers import BookingSerializer, ListingSerializer, ListingSummarySerializer, PaymentSerializer, ReviewSerializer
+from .tasks import apply_payment_statuses, verify_payment_task
+from .throttles import ListingAnonReadThrottle, PaymentInitiateThrottle, PaymentVerifyThrottle
+from .views import review_queryset
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        ORJSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json')
+
+
+def check_throttles(request, throttles):
+    """
+    Raise Throttled if any throttle refuses the request, as DRF does.
+    """
+    waits = []
+    for throttle_class in throttles:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if waits:
+        raise Throttled(max(
+            (wait for wait in waits if wait is not None), default=None))
+
+
+def async_api_view(methods=('GET',), authenticated=False, throttles=()):
+    """
+    Authenticate the JWT, enforce the allowed methods and throttles and
+    render DRF exceptions the way DRF's exception handler does.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    return render(
+                        {"detail": f'Method "{request.method}" not allowed.'},
+                        status.HTTP_405_METHOD_NOT_ALLOWED)
+                result = await ClaimsJWTAuthentication().aauthenticate(request)
+                request.user = result[0] if result else AnonymousUser()
+                if authenticated and not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                if throttles:
+                    await sync_to_async(check_throttles)(request, throttles)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                detail = exc.detail
+                if not isinstance(detail, (list, dict)):
+                    detail = {"detail": detail}
+                response = render(detail, exc.status_code)
+                if getattr(exc, 'wait', None):
+                    # Rounded up like DRF, so a client waiting this long
+                    # is admitted
+                    response['Retry-After'] = '%d' % math.ceil(exc.wait)
+                return response
+        # Authenticated by header, not by session cookie
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def encode_cursor(created_at, pk, reverse=False):
+    raw = json.dumps([created_at.isoformat(), str(pk), reverse]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Return (created_at, pk, reverse). `reverse` cursors point back to
+    the rows before the position.
+    """
+    try:
+        created_at, pk, reverse = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), uuid.UUID(pk), bool(reverse)
+    except (ValueError, TypeError):
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+
+
+def fieldset(request, serializer_class):
+    """
+    Return the fields requested with `?fields=`/`?omit=`, or None.
+    """
+    return parse_fieldset(request.GET, list(serializer_class().fields))
+
+
+async def keyset_page(request, queryset):
+    """
+    Return one page of `queryset`, newest first, and the URLs of the
+    next and previous pages. Pages are addressed by a cursor on
+    (created_at, pk) so deep pages cost the same as the first one.
+    """
+    try:
+        page_size = min(
+            int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = PAGE_SIZE
+    page_size = max(page_size, 1)
+
+    cursor = request.GET.get('cursor')
+    reverse = False
+    if cursor is None:
+        queryset = queryset.order_by('-created_at', '-pk')
+    else:
+        created_at, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            # Walk back from the position, then flip the page
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at)
+                | Q(created_at=created_at, pk__gt=pk)
+            ).order_by('created_at', 'pk')
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at)
+                | Q(created_at=created_at, pk__lt=pk)
+            ).order_by('-created_at', '-pk')
+
+    rows = [row async for row in queryset[:page_size + 1].aiterator()]
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+    # A cursor was handed out from a page on its other side
+    has_next = cursor is not None if reverse else more
+    has_previous = more if reverse else cursor is not None
+
+    def link(row, reverse):
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor(row.created_at, row.pk, reverse)
+        return request.build_absolute_uri(
+            f"{request.path}?{query.urlencode()}")
+    next_url = link(rows[-1], False) if has_next and rows else None
+    previous_url = link(rows[0], True) if has_previous and rows else None
+    return rows, next_url, previous_url
+
+
+def page(serializer_class, rows, next_url, previous_url, fields):
+    return {
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer_class(rows, many=True, fields=fields).data,
+    }
+
+
+async def get_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise NotFound()
+
+
+@async_api_view(throttles=(ListingAnonReadThrottle,))
+async def listing_list(request):
+    serializer_class = ListingSummarySerializer
+    queryset = Listing.objects.all()
+    if 'bookings' in request.GET.get('expand', '').split(','):
+        serializer_class = ListingSerializer
+    fields = fieldset(request, serializer_class)
+    if (serializer_class is ListingSerializer
+            and 'bookings' in (fields or ['bookings'])):
+        queryset = queryset.prefetch_related('bookings')
+    return render(page(
+        serializer_class, *await keyset_page(request, queryset), fields))
+
+
+@async_api_view(throttles=(ListingAnonReadThrottle,))
+async def listing_detail(request, listing_id):
+    fields = fieldset(request, ListingSerializer)
+    queryset = Listing.objects.all()
+    if 'bookings' in (fields or ['bookings']):
+        queryset = queryset.prefetch_related('bookings')
+    listing = await get_or_404(queryset, pk=listing_id)
+    return render(ListingSerializer(listing, fields=fields).data)
+
+
+@async_api_view()
+async def review_list(request):
+    fields = fieldset(request, ReviewSerializer)
+    return render(page(
+        ReviewSerializer, *await keyset_page(request, review_queryset()),
+        fields))
+
+
+@async_api_view()
+async def review_detail(request, review_id):
+    fields = fieldset(request, ReviewSerializer)
+    review = await get_or_404(review_queryset(), pk=review_id)
+    return render(ReviewSerializer(review, fields=fields).data)
+
+
+def booking_queryset(user):
+    """
+    Ensure a user only sees their own bookings.
+    """
+    if user.role == 'guest':
+        return Booking.objects.filter(user_id=user.pk)
+    elif user.role == 'host':
+        return Booking.objects.filter(listing__host_id=user.pk)
+    return Booking.objects.none()
+
+
+@async_api_view(authenticated=True)
+async def booking_list(request):
+    fields = fieldset(request, BookingSerializer)
+    return render(page(
+        BookingSerializer,
+        *await keyset_page(request, booking_queryset(request.user)),
+        fields))
+
+
+@async_api_view(authenticated=True)
+async def booking_detail(request, booking_id):
+    fields = fieldset(request, BookingSerializer)
+    booking = await get_or_404(
+        booking_queryset(request.user), pk=booking_id)
+    # Only the guest who booked may retrieve it
+    if booking.user_id != request.user.pk:
+        raise PermissionDenied()
+    return render(BookingSerializer(booking, fields=fields).data)
+
+
+def create_payment(data):
+    serializer = PaymentSerializer(data=data)
+    if serializer.is_valid():
+        serializer.save()
+        return serializer.data, status.HTTP_201_CREATED
+    return serializer.errors, status.HTTP_400_BAD_REQUEST
+
+
+@async_api_view(methods=('POST',), authenticated=True,
+                throttles=(PaymentInitiateThrottle,))
+async def initiate_payment(request):
+    """Initiate Chapa checkout"""
+    if request.user.role != 'guest':
+        raise PermissionDenied()
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValidationError({"error": "invalid JSON body"})
+    booking_id = data.get("booking") if isinstance(data, dict) else None
+    if not booking_id:
+        return render({"error": "booking id required"},
+                      status.HTTP_400_BAD_REQUEST)
+
+    try:
+        booking = await Booking.objects.only(
+            "total_price").aget(booking_id=booking_id)
+    except (Booking.DoesNotExist, DjangoValidationError):
+        return render({"error": "booking not found"},
+                      status.HTTP_400_BAD_REQUEST)
+
+    tx_ref = uuid.uuid4()
+    amount = booking.total_price
+    payload = {
+        "amount": str(amount),
+        "currency": "USD",
+        "tx_ref": str(tx_ref),
+    }
+
+    try:
+        response_data = await get_async_client().initialize(payload)
+    except ChapaUnavailable:
+        PAYMENT_INITIATIONS.labels('unavailable').inc()
+        return render({"error": "payment provider unreachable"},
+                      status.HTTP_503_SERVICE_UNAVAILABLE)
+    except ChapaBadResponse:
+        PAYMENT_INITIATIONS.labels('bad_response').inc()
+        return render({"error": "invalid response from payment provider"},
+                      status.HTTP_502_BAD_GATEWAY)
+
+    if response_data.get("status") == "failed":
+        PAYMENT_INITIATIONS.labels('rejected').inc()
+        return render(response_data, status.HTTP_400_BAD_REQUEST)
+    PAYMENT_INITIATIONS.labels('success').inc()
+
+    body, status_code = await sync_to_async(create_payment)({
+        **data,
+        "tx_ref": tx_ref,
+        "amount": amount,
+    })
+    return render(body, status_code)
+
+
+@async_api_view(authenticated=True, throttles=(PaymentVerifyThrottle,))
+async def verify_payment(request, tx_ref):
+    """
+    Verify Chapa payment
+
+    With `?async=true` the verification is queued on Celery and the
+    current payment is returned immediately with 202 Accepted.
+    `?fields=` and `?omit=` trim the rendered payment.
+    """
+    fields = parse_fieldset(request.GET, PaymentSerializer.Meta.fields)
+    try:
+        payment = await Payment.objects.aget(tx_ref=tx_ref)
+    except Payment.DoesNotExist:
+        return render({"error": "payment not found"},
+                      status.HTTP_404_NOT_FOUND)
+
+    if request.GET.get("async") in ("1", "true"):
+        if payment.status == Payment.PaymentStatus.PENDING:
+            await sync_to_async(verify_payment_task.delay)(str(tx_ref))
+        return render(PaymentSerializer(payment, fields=fields).data,
+                      status.HTTP_202_ACCEPTED)
+
+    try:
+        response_data = await get_async_client().verify(tx_ref)
+    except ChapaUnavailable:
+        PAYMENT_VERIFICATIONS.labels('unavailable').inc()
+        return render({"error": "payment provider unreachable"},
+                      status.HTTP_503_SERVICE_UNAVAILABLE)
+    except ChapaBadResponse:
+        PAYMENT_VERIFICATIONS.labels('bad_response').inc()
+        return render({"error": "invalid response from payment provider"},
+                      status.HTTP_502_BAD_GATEWAY)
+
+    if response_data.get("status") == "failed":
+        PAYMENT_VERIFICATIONS.labels('rejected').inc()
+        return render(response_data, status.HTTP_400_BAD_REQUEST)
+
+    new_status = transaction_status(response_data)
+    PAYMENT_VERIFICATIONS.labels(new_status or 'pending').inc()
+    if await sync_to_async(apply_payment_statuses)({payment.tx_ref: new_status}):
+        await payment.arefresh_from_db(fields=['status'])
+    return render(PaymentSerializer(payment, fields=fields).data)
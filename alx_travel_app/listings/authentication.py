@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+
+class UserStateCache:
+    """
+    Small in-process TTL cache of (token_version, is_active) per user.
+
+    Revoking tokens takes effect in other processes once their entry
+    expires, i.e. within JWT_USER_CACHE_TTL seconds.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def _store(self, user_id, state):
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+            self._entries[user_id] = (
+                time.monotonic() + settings.JWT_USER_CACHE_TTL, state)
+        return state
+
+    def _query(self, user_id):
+        return (User.objects.filter(pk=user_id)
+                .values_list('token_version', 'is_active'))
+
+    def get(self, user_id):
+        entry = self._cached(user_id)
+        if entry is not None:
+            return entry[1]
+        return self._store(user_id, self._query(user_id).first())
+
+    async def aget(self, user_id):
+        entry = self._cached(user_id)
+        if entry is not None:
+            return entry[1]
+        return self._store(user_id, await self._query(user_id).afirst())
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_state_cache = UserStateCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from signed token claims.
+
+    Tokens issued by `ClaimsTokenObtainPairSerializer` carry the user's
+    role, username, staff flag and token version. The only per-request
+    lookup is the cached (token_version, is_active) pair, so the
+    booking and payment hot path runs no user query. Bumping
+    `User.token_version` revokes every token issued before; `User.save`
+    does so whenever the role, staff or active flag changes. Tokens
+    without these claims fall back to the regular database lookup.
+
+    The returned user only has the claimed fields set and must never
+    be saved.
+    """
+
+    def claimed_user_id(self, validated_token):
+        """
+        Return the user id of a token that carries the claims, else None.
+        """
+        if 'role' not in validated_token or 'tv' not in validated_token:
+            return None
+        try:
+            return uuid.UUID(str(validated_token[api_settings.USER_ID_CLAIM]))
+        except (KeyError, ValueError):
+            return None
+
+    def get_user(self, validated_token):
+        user_id = self.claimed_user_id(validated_token)
+        if user_id is None:
+            return super().get_user(validated_token)
+        return self.claimed_user(
+            user_id, validated_token, user_state_cache.get(user_id))
+
+    async def aauthenticate(self, request):
+        """
+        Async `authenticate` for plain Django async views.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id = self.claimed_user_id(validated_token)
+        if user_id is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+        else:
+            user = self.claimed_user(
+                user_id, validated_token, await user_state_cache.aget(user_id))
+        return user, validated_token
+
+    def claimed_user(self, user_id, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        token_version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token['tv'] != token_version:
+            raise AuthenticationFailed(
+                _("Token has been revoked"), code="token_revoked")
+
+        user = User(
+            user_id=user_id,
+            username=validated_token.get('username', ''),
+            role=validated_token['role'],
+            is_staff=validated_token.get('is_staff', False),
+            is_active=True,
+            token_version=token_version)
+        user._state.adding = False
+        user._state.db = User.objects.db
+        return user
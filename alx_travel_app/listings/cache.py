@@ -0,0 +1,130 @@
+"""
+Response cache for public listing reads.
+
+Entries are keyed on a version number that is bumped whenever a listing,
+or one of its bookings or reviews, is written. Stale entries are never
+read again and simply expire. The key doubles as the ETag, so a
+conditional request is answered with 304 from a single cache lookup.
+"""
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+LISTINGS_VERSION_KEY = 'listings:version'
+# Part of every per-listing key, so bulk rewrites can expire them all
+ALL_LISTINGS_VERSION_KEY = 'listings:all:version'
+STATS_KEYS = {
+    'hits': 'listings:cache:hits',
+    'misses': 'listings:cache:misses',
+    'not_modified': 'listings:cache:not_modified',
+}
+
+
+def listing_version_key(listing_id):
+    return f'listing:{listing_id}:version'
+
+
+def _incr(key, initial=0):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def _bump_version(key):
+    # Seed missing versions from the clock so an evicted counter
+    # never falls back to a number that was already used
+    return _incr(key, initial=time.time_ns())
+
+
+def _versions(*keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_listings(listing_ids=(), all_listings=False):
+    """
+    Bump the versions of the given listings and of the listing index
+    once the current transaction commits. `all_listings` also expires
+    the cached reads of every single listing, for bulk rewrites.
+    """
+    def bump():
+        _bump_version(LISTINGS_VERSION_KEY)
+        if all_listings:
+            _bump_version(ALL_LISTINGS_VERSION_KEY)
+        for listing_id in set(listing_ids):
+            _bump_version(listing_version_key(listing_id))
+    transaction.on_commit(bump)
+
+
+def cache_stats():
+    """
+    Return the shared hit/miss counters.
+    """
+    return {
+        name: cache.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def cached_listing_read(per_listing=False, daily=False):
+    """
+    Cache the JSON response of a listing read and honour If-None-Match.
+
+    With `per_listing` the entry is tied to the version of the listing in
+    the URL, otherwise to the version of the whole listing index. With
+    `daily` it is also tied to today's date, for reads whose defaults
+    depend on it.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.accepted_renderer.format != 'json':
+                return method(self, request, *args, **kwargs)
+
+            if per_listing:
+                version_keys = (ALL_LISTINGS_VERSION_KEY,
+                                listing_version_key(kwargs['pk']))
+            else:
+                version_keys = (LISTINGS_VERSION_KEY,)
+            stamp = ''.join(
+                f"{key}:{version}:" for key, version
+                in zip(version_keys, _versions(*version_keys)))
+            if daily:
+                stamp += f"{date.today().isoformat()}:"
+            digest = hashlib.sha1(
+                f"{stamp}{request.get_full_path()}".encode()).hexdigest()
+            etag = f'"{digest}"'
+
+            if etag in request.headers.get('If-None-Match', ''):
+                _incr(STATS_KEYS['not_modified'])
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': etag})
+
+            key = f'listings:response:{digest}'
+            data = cache.get(key)
+            if data is not None:
+                _incr(STATS_KEYS['hits'])
+                response = Response(data)
+            else:
+                _incr(STATS_KEYS['misses'])
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, settings.LISTING_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
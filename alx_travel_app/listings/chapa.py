@@ -0,0 +1,358 @@
+"""
+Client for the Chapa payment gateway.
+
+All calls go through one pooled `requests.Session` with bounded
+connect/read timeouts. Verification is idempotent and retried with
+jittered exponential backoff; initialization is not retried. A circuit
+breaker fails fast while the provider is down.
+
+`AsyncChapaClient` does the same over `httpx.AsyncClient` for async
+views, so waiting on the provider does not hold a worker thread. Both
+clients share one circuit breaker.
+"""
+import asyncio
+import hashlib
+import hmac
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from .metrics import CHAPA_REQUEST_SECONDS
+
+
+class ChapaError(Exception):
+    """Base error for payment provider failures."""
+
+
+class ChapaUnavailable(ChapaError):
+    """The provider could not be reached or the circuit is open."""
+
+
+class ChapaBadResponse(ChapaError):
+    """The provider answered with something that is not JSON."""
+
+
+class CircuitBreaker:
+    """
+    Minimal thread-safe circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are rejected until `reset_timeout` seconds have passed. The
+    circuit is then half-open: one call is let through as a trial while
+    the others keep failing fast. Success closes the circuit, failure
+    opens it again. A trial that never reports back is replaced after
+    another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return True
+            if (self._trial_at is not None
+                    and now - self._trial_at < self.reset_timeout):
+                # Half-open with the trial call still in flight
+                return True
+            self._trial_at = now
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._trial_at is not None
+                    or self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._trial_at = None
+
+
+class ChapaClient:
+    """
+    Thin wrapper around the Chapa transaction API.
+    """
+
+    def __init__(self, secret_key, base_url, connect_timeout=3.05,
+                 read_timeout=10.0, max_retries=3, backoff=0.2,
+                 pool_maxsize=20, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {secret_key}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def initialize(self, payload):
+        """
+        Start a checkout. Not retried, since it is not idempotent.
+        """
+        return self._request(
+            'initialize', 'POST', '/transaction/initialize',
+            json=payload, attempts=1)
+
+    def verify(self, tx_ref):
+        """
+        Look up the status of a transaction.
+        """
+        return self._request(
+            'verify', 'GET', f'/transaction/verify/{tx_ref}',
+            attempts=self.max_retries + 1)
+
+    def _request(self, operation, method, path, attempts=1, **kwargs):
+        url = f"{self.base_url}{path}"
+        for attempt in range(attempts):
+            if self.breaker.is_open:
+                CHAPA_REQUEST_SECONDS.labels(
+                    operation, 'circuit_open').observe(0)
+                raise ChapaUnavailable("payment provider circuit is open")
+            if attempt:
+                # Full jitter: sleep a random slice of the backoff window
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as exc:
+                CHAPA_REQUEST_SECONDS.labels(operation, 'network_error').observe(
+                    time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = ChapaUnavailable(str(exc))
+                continue
+            if response.status_code >= 500:
+                CHAPA_REQUEST_SECONDS.labels(operation, 'server_error').observe(
+                    time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = ChapaUnavailable(
+                    f"payment provider returned {response.status_code}")
+                continue
+
+            CHAPA_REQUEST_SECONDS.labels(operation, 'ok').observe(
+                time.perf_counter() - started)
+            self.breaker.record_success()
+            try:
+                return response.json()
+            except ValueError:
+                raise ChapaBadResponse("invalid response from payment provider")
+        raise error
+
+
+class AsyncChapaClient:
+    """
+    Async counterpart of `ChapaClient`, bound to one event loop.
+
+    httpx checks every pooled connection on each request, which gets
+    slow past a few dozen connections, so the pool is split across
+    several small clients. Callers wait for a free connection slot on
+    an asyncio queue.
+    """
+
+    SHARD_CONNECTIONS = 10
+
+    def __init__(self, secret_key, base_url, connect_timeout=3.05,
+                 read_timeout=10.0, max_retries=3, backoff=0.2,
+                 pool_maxsize=100, breaker=None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.clients = [
+            httpx.AsyncClient(
+                base_url=base_url.rstrip('/'),
+                headers={
+                    "Authorization": f"Bearer {secret_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.SHARD_CONNECTIONS),
+            )
+            for _ in range(max(1, -(-pool_maxsize // self.SHARD_CONNECTIONS)))
+        ]
+        self.slots = asyncio.Queue()
+        for slot in range(pool_maxsize):
+            self.slots.put_nowait(self.clients[slot % len(self.clients)])
+
+    async def initialize(self, payload):
+        """
+        Start a checkout. Not retried, since it is not idempotent.
+        """
+        return await self._request(
+            'initialize', 'POST', '/transaction/initialize',
+            json=payload, attempts=1)
+
+    async def verify(self, tx_ref):
+        """
+        Look up the status of a transaction.
+        """
+        return await self._request(
+            'verify', 'GET', f'/transaction/verify/{tx_ref}',
+            attempts=self.max_retries + 1)
+
+    async def _request(self, operation, method, path, attempts=1, **kwargs):
+        for attempt in range(attempts):
+            if self.breaker.is_open:
+                CHAPA_REQUEST_SECONDS.labels(
+                    operation, 'circuit_open').observe(0)
+                raise ChapaUnavailable("payment provider circuit is open")
+            if attempt:
+                await asyncio.sleep(
+                    random.uniform(0, self.backoff * 2 ** attempt))
+            client = await self.slots.get()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+            except httpx.HTTPError as exc:
+                CHAPA_REQUEST_SECONDS.labels(operation, 'network_error').observe(
+                    time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = ChapaUnavailable(str(exc))
+                continue
+            finally:
+                self.slots.put_nowait(client)
+            if response.status_code >= 500:
+                CHAPA_REQUEST_SECONDS.labels(operation, 'server_error').observe(
+                    time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = ChapaUnavailable(
+                    f"payment provider returned {response.status_code}")
+                continue
+
+            CHAPA_REQUEST_SECONDS.labels(operation, 'ok').observe(
+                time.perf_counter() - started)
+            self.breaker.record_success()
+            try:
+                return response.json()
+            except ValueError:
+                raise ChapaBadResponse("invalid response from payment provider")
+        raise error
+
+
+_client = None
+_breaker = None
+_client_lock = threading.Lock()
+# httpx connections belong to the loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_breaker():
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            settings.CHAPA_CIRCUIT_FAILURE_THRESHOLD,
+            settings.CHAPA_CIRCUIT_RESET_TIMEOUT)
+    return _breaker
+
+
+def get_client():
+    """
+    Return the process-wide Chapa client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ChapaClient(
+                    secret_key=settings.CHAPA_SECRET_KEY,
+                    base_url=settings.CHAPA_BASE_URL,
+                    connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+                    read_timeout=settings.CHAPA_READ_TIMEOUT,
+                    max_retries=settings.CHAPA_MAX_RETRIES,
+                    breaker=_get_breaker(),
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    Return the Chapa client of the running event loop. Must be called
+    from a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _client_lock:
+            client = _async_clients[loop] = AsyncChapaClient(
+                secret_key=settings.CHAPA_SECRET_KEY,
+                base_url=settings.CHAPA_BASE_URL,
+                connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+                read_timeout=settings.CHAPA_READ_TIMEOUT,
+                max_retries=settings.CHAPA_MAX_RETRIES,
+                pool_maxsize=settings.CHAPA_ASYNC_POOL_SIZE,
+                breaker=_get_breaker(),
+            )
+    return client
+
+
+def transaction_status(response_data):
+    """
+    Map a verify response to a payment status: 'success', 'failed',
+    or None while the transaction is still pending.
+    """
+    data = response_data.get("data") or {}
+    if data.get("status") == "success":
+        return "success"
+    if data.get("status") == "failed/cancelled":
+        return "failed"
+    return None
+
+
+def webhook_status(payload):
+    """
+    Map a webhook payload to a payment status, or None if it does not
+    describe a final transaction state.
+    """
+    event_status = str(payload.get("status", "")).lower()
+    if event_status == "success":
+        return "success"
+    if event_status in ("failed", "failed/cancelled", "cancelled"):
+        return "failed"
+    return None
+
+
+def verify_webhook_signature(body, signature, secret):
+    """
+    Check the HMAC-SHA256 signature Chapa sends with a webhook body.
+    """
+    if not signature or not secret:
+        return False
+    expected = hmac.new(
+        secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def reset_client():
+    """
+    Drop the process-wide client so the next call picks up new settings.
+    """
+    global _client, _breaker
+    with _client_lock:
+        _client = None
+        _breaker = None
+        _async_clients.clear()
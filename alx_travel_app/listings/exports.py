@@ -0,0 +1,112 @@
+"""
+Streaming CSV and NDJSON exports of bookings and payments.
+
+Rows are read in keyset-paginated chunks ordered by primary key, so a
+worker holds one chunk at a time however many rows match. A plain
+`.iterator()` is not enough on MySQL, whose client library buffers the
+whole result set. Output can be gzip-compressed as it is produced.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Booking, Payment
+
+
+EXPORTS = {
+    'bookings': (Booking, [
+        'booking_id',
+        'listing_id',
+        'user_id',
+        'start_date',
+        'end_date',
+        'total_price',
+        'status',
+        'created_at',
+    ]),
+    'payments': (Payment, [
+        'payment_id',
+        'tx_ref',
+        'booking_id',
+        'amount',
+        'status',
+        'created_at',
+    ]),
+}
+
+
+def row_chunks(queryset, fields, chunk_size):
+    """
+    Yield lists of up to `chunk_size` value tuples, walking the primary
+    key instead of holding a cursor open.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [row[1:] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def isoformat(value):
+    """
+    Format a datetime as ISO 8601 with milliseconds and `Z` for UTC, the
+    way DjangoJSONEncoder does, so both formats export the same text.
+    """
+    text = value.isoformat()
+    if value.microsecond:
+        text = text[:23] + text[26:]
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+def iso_row(row):
+    return [isoformat(value) if isinstance(value, datetime) else value
+            for value in row]
+
+
+def csv_chunks(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in chunks:
+        writer.writerows(map(iso_row, rows))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(fields, chunks):
+    encoder = DjangoJSONEncoder()
+    for rows in chunks:
+        yield ''.join(
+            encoder.encode(dict(zip(fields, iso_row(row)))) + '\n' for row in rows)
+
+
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
+
+
+def gzip_chunks(chunks):
+    """
+    Compress a stream of text chunks into a single gzip member.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,125 @@
+"""
+A local stand-in for the Chapa API, used by the benchmarks and tests.
+
+It answers transaction initialize and verify calls with canned payloads,
+optionally after a fixed delay or with a 503 to emulate an outage, and
+counts the requests it receives.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeChapaHandler(BaseHTTPRequestHandler):
+    # Keep connections alive so clients can pool them
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, code=200):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _behave(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.down:
+            self._reply({"message": "unavailable"}, code=503)
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self._behave():
+            return
+        if not self.path.endswith("/transaction/initialize"):
+            return self._reply({"status": "failed"}, code=404)
+        self._reply({
+            "message": "Hosted Link",
+            "status": "success",
+            "data": {
+                "checkout_url":
+                    f"https://checkout.chapa.co/checkout/payment/{body.get('tx_ref')}",
+            },
+        })
+
+    def do_GET(self):
+        if not self._behave():
+            return
+        prefix = "/transaction/verify/"
+        if prefix not in self.path:
+            return self._reply({"status": "failed"}, code=404)
+        tx_ref = self.path.rsplit(prefix, 1)[1]
+        self._reply({
+            "message": "Payment details",
+            "status": "success",
+            "data": {"tx_ref": tx_ref, "status": self.server.verify_status},
+        })
+
+
+class FakeChapaHTTPServer(ThreadingHTTPServer):
+    # Room for a burst of concurrent connections from the benchmarks
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the reply
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeChapaServer:
+    """
+    Run the fake API on a background thread.
+
+        with FakeChapaServer(latency=0.05) as chapa:
+            settings.CHAPA_BASE_URL = chapa.base_url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0,
+                 verify_status="success"):
+        self.httpd = FakeChapaHTTPServer((host, port), FakeChapaHandler)
+        self.httpd.latency = latency
+        self.httpd.down = False
+        self.httpd.verify_status = verify_status
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def set_down(self, down=True):
+        self.httpd.down = down
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
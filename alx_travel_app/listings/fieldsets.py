@@ -0,0 +1,243 @@
+"""
+Sparse fieldsets for reads.
+
+`?fields=name,price_per_night` renders only the listed top-level fields
+and `?omit=description` renders all but the listed ones. The queryset is
+narrowed to the columns those fields read with `.only()`, so trimmed
+fields are neither loaded nor serialized. Writes ignore both parameters:
+trimming a serializer would also drop its writable fields.
+
+List routes may also skip model instances altogether. The page is
+fetched with `.values()` and each column goes straight to its serializer
+field's `to_representation`, which renders the same JSON as the
+serializer without building a model instance or walking the field
+sources of every row.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin taking a `fields` keyword with the names of the
+    fields to keep.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _names(query_params, param):
+    value = query_params.get(param, '')
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    return names or None
+
+
+def parse_fieldset(query_params, available):
+    """
+    Return the names of the `available` fields a read should render, in
+    serializer order, or None to render all of them.
+    """
+    fields = _names(query_params, 'fields')
+    omit = _names(query_params, 'omit')
+    if fields is None and omit is None:
+        return None
+    errors = {}
+    for param, names in (('fields', fields), ('omit', omit)):
+        unknown = [name for name in names or () if name not in available]
+        if unknown:
+            errors[param] = [f"Unknown field(s): {', '.join(unknown)}"]
+    if errors:
+        raise ValidationError(errors)
+    return [name for name in available
+            if (fields is None or name in fields)
+            and (omit is None or name not in omit)]
+
+
+def only_columns(serializer):
+    """
+    Return the model fields `serializer` reads, for `.only()`, or None
+    if a field reads something other than model fields.
+
+    Properties are resolved through `Meta.source_columns`, which maps
+    them to the columns they are computed from.
+    """
+    model = serializer.Meta.model
+    source_columns = getattr(serializer.Meta, 'source_columns', {})
+    columns = {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source in source_columns:
+            columns.update(source_columns[field.source])
+            continue
+        if len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            # Prefetched with queries of their own
+            continue
+        columns.add(field.source)
+        if isinstance(field, BaseSerializer):
+            nested = only_columns(field)
+            if nested is None:
+                return None
+            columns.update(f"{field.source}__{column}" for column in nested)
+    return columns
+
+
+def value_renderers(serializer):
+    """
+    Return (columns, [(name, render)]) to render `.values()` rows the
+    way `serializer` renders instances, or None if a field needs a model
+    instance.
+    """
+    model = serializer.Meta.model
+    source_columns = getattr(serializer.Meta, 'source_columns', {})
+    columns, renderers = set(), []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, BaseSerializer) or len(field.source_attrs) != 1:
+            return None
+        if field.source in source_columns:
+            # Evaluate the property on an attribute view of the row
+            prop = getattr(model, field.source)
+            columns.update(source_columns[field.source])
+            render = (lambda row, get=prop.fget, field=field:
+                      _present(field, get(RowView(row, model))))
+        else:
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            if isinstance(field, RelatedField):
+                # The row already holds the related primary key
+                if getattr(field, 'many', False):
+                    return None
+                convert = (field.pk_field.to_representation
+                           if getattr(field, 'pk_field', None)
+                           else (lambda value: value))
+            else:
+                if isinstance(field, DateTimeField) and not hasattr(field, 'timezone'):
+                    # Look the current timezone up once, not once per value
+                    field.timezone = field.default_timezone()
+                convert = field.to_representation
+            columns.add(field.source)
+            render = (lambda row, column=field.source, convert=convert:
+                      None if row[column] is None else convert(row[column]))
+        renderers.append((name, render))
+    return columns, renderers
+
+
+def _present(field, value):
+    return None if value is None else field.to_representation(value)
+
+
+class RowView:
+    """
+    A `.values()` row whose columns read as attributes, falling back to
+    the model class for constants such as `Listing.RATING_FIELDS`.
+    """
+
+    __slots__ = ('row', 'model')
+
+    def __init__(self, row, model):
+        self.row = row
+        self.model = model
+
+    def __getattr__(self, name):
+        try:
+            return self.row[name]
+        except KeyError:
+            return getattr(self.model, name)
+
+
+def render_values(rows, renderers):
+    return [{name: render(row) for name, render in renderers}
+            for row in rows]
+
+
+class SparseFieldsetMixin:
+    """
+    Viewset mixin honouring `?fields=` and `?omit=` on reads.
+
+    With `render_from_values` the list route renders its page from
+    `.values()` rows whenever every rendered field maps to a column.
+    """
+
+    render_from_values = False
+    # Loaded even when not rendered, e.g. for object permissions
+    required_columns = ()
+
+    def get_fieldset(self):
+        """
+        Return the requested field names, or None for all of them.
+        """
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not hasattr(self, '_fieldset'):
+            serializer = self.get_serializer_class()(
+                context=self.get_serializer_context())
+            self._fieldset = parse_fieldset(
+                self.request.query_params, list(serializer.fields))
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault('fields', fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+    def extra_columns(self):
+        """
+        Columns read by the paginator or the view rather than the
+        serializer.
+        """
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return {name.lstrip('-') for name in ordering} | set(self.required_columns)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset() is None:
+            return queryset
+        columns = only_columns(self.get_serializer())
+        if columns is None:
+            return queryset
+        related = queryset.query.select_related
+        if isinstance(related, dict) and set(related) - columns:
+            # A deferred relation cannot be followed by select_related
+            queryset = queryset.select_related(None)
+            kept = [name for name in related if name in columns]
+            if kept:
+                queryset = queryset.select_related(*kept)
+        return queryset.only(*columns, *self.extra_columns())
+
+    def list(self, request, *args, **kwargs):
+        if not self.render_from_values:
+            return super().list(request, *args, **kwargs)
+        plan = value_renderers(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        columns, renderers = plan
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *columns, *self.extra_columns())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(render_values(queryset, renderers))
+        return self.get_paginated_response(render_values(page, renderers))
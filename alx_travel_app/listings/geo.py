@@ -0,0 +1,141 @@
+"""
+Proximity search over listing coordinates.
+
+A point is folded into a 52-bit geocell by interleaving 26 bits of
+longitude with 26 bits of latitude, the bit layout of a geohash. Every
+prefix of those bits names a lat/lng cell whose points form one
+contiguous range of integers, so a plain B-tree index on the column
+answers "which listings lie in these cells" with range scans on MySQL,
+PostgreSQL and SQLite alike. A radius search covers the bounding box of
+the circle with a few cells at the finest level that keeps the cover
+small, then keeps the candidates within the exact haversine distance.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Bits per axis of a stored geocell
+LEVELS = 26
+# Widest cover, in cells along each axis
+MAX_CELLS_PER_AXIS = 4
+
+
+def _spread(bits):
+    """
+    Move bit i of a 32-bit integer to bit 2i.
+    """
+    bits = (bits | (bits << 16)) & 0x0000FFFF0000FFFF
+    bits = (bits | (bits << 8)) & 0x00FF00FF00FF00FF
+    bits = (bits | (bits << 4)) & 0x0F0F0F0F0F0F0F0F
+    bits = (bits | (bits << 2)) & 0x3333333333333333
+    return (bits | (bits << 1)) & 0x5555555555555555
+
+
+def _cell(lat_index, lng_index):
+    return (_spread(lng_index) << 1) | _spread(lat_index)
+
+
+def _lat_index(latitude, level):
+    index = int((latitude + 90) / 180 * (1 << level))
+    return min(max(index, 0), (1 << level) - 1)
+
+
+def _lng_index(longitude, level):
+    index = int((longitude + 180) % 360 / 360 * (1 << level))
+    return min(index, (1 << level) - 1)
+
+
+def geocell(latitude, longitude):
+    """
+    Return the geocell of a point, or None without coordinates.
+    """
+    if latitude is None or longitude is None:
+        return None
+    return _cell(_lat_index(float(latitude), LEVELS),
+                 _lng_index(float(longitude), LEVELS))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2)
+         * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def cover(latitude, longitude, radius_km):
+    """
+    Return sorted [low, high) geocell ranges that hold every point within
+    `radius_km` of the given one, or None if the circle is too large to
+    prune anything.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # Widest longitude the circle reaches; all of them around a pole
+    reach = math.sin(radius_km / EARTH_RADIUS_KM)
+    if south <= -90 or north >= 90 or reach >= math.cos(math.radians(latitude)):
+        dlng = 180.0
+    else:
+        dlng = math.degrees(math.asin(reach / math.cos(math.radians(latitude))))
+
+    for level in range(LEVELS, 0, -1):
+        cells = 1 << level
+        lat_cells = range(_lat_index(south, level), _lat_index(north, level) + 1)
+        if dlng >= 90:
+            west, span = 0, cells
+        else:
+            west = _lng_index(longitude - dlng, level)
+            span = (_lng_index(longitude + dlng, level) - west) % cells + 1
+        if len(lat_cells) <= MAX_CELLS_PER_AXIS and span <= MAX_CELLS_PER_AXIS:
+            break
+    lng_cells = [(west + offset) % cells for offset in range(span)]
+
+    shift = 2 * (LEVELS - level)
+    ranges = []
+    for low in sorted(
+            _cell(lat, lng) << shift for lat in lat_cells for lng in lng_cells):
+        high = low + (1 << shift)
+        # Neighbouring cells are often consecutive ranges
+        if ranges and ranges[-1][1] == low:
+            ranges[-1][1] = high
+        else:
+            ranges.append([low, high])
+    if ranges == [[0, 1 << 2 * LEVELS]]:
+        return None
+    return [tuple(bounds) for bounds in ranges]
+
+
+def distance_km(latitude, longitude):
+    """
+    Haversine distance in km from the given point to each row's
+    coordinates, as a database expression.
+    """
+    phi = math.radians(latitude)
+    row_phi = Radians(Cast(F('latitude'), FloatField()))
+    row_lng = Cast(F('longitude'), FloatField())
+    a = (Power(Sin((row_phi - Value(phi)) / 2), 2)
+         + Cos(row_phi) * Value(math.cos(phi))
+         * Power(Sin(Radians(row_lng - Value(float(longitude))) / 2), 2))
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Filter a listing queryset to the listings within `radius_km` of the
+    point, annotated with `distance_km` and ordered nearest first.
+    """
+    ranges = cover(latitude, longitude, radius_km)
+    if ranges is None:
+        queryset = queryset.filter(geocell__isnull=False)
+    else:
+        cells = Q()
+        for low, high in ranges:
+            cells |= Q(geocell__gte=low, geocell__lt=high)
+        queryset = queryset.filter(cells)
+    return queryset.annotate(
+        distance_km=distance_km(latitude, longitude)
+    ).filter(distance_km__lte=radius_km).order_by('distance_km', 'listing_id')
@@ -0,0 +1,23 @@
+"""
+Helpers shared by the benchmark commands. The leading underscore keeps
+Django from listing this module as a command.
+"""
+from django.conf import settings
+from django.test.utils import override_settings
+
+
+UNLIMITED_RATE = '1000000/s'
+
+
+def lifted_throttles():
+    """
+    Override the settings so every scope admits a million requests a
+    second. The throttles still run, so load tests from a handful of
+    clients keep measuring their cost.
+    """
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {
+            scope: UNLIMITED_RATE
+            for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']},
+    })
@@ -0,0 +1,83 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from listings.cache import invalidate_listings
+from listings.geo import geocell
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = ("Fill in listing coordinates from a gazetteer and compute the "
+            "geocells used by the nearby search")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--gazetteer", default=None,
+            help="CSV of location,latitude,longitude rows; listings without "
+                 "coordinates whose location matches a row get its point")
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Recompute every geocell, not only the missing ones")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        located = 0
+        if options["gazetteer"]:
+            located = self.apply_gazetteer(options["gazetteer"])
+        updated = self.fill_geocells(options["batch_size"], options["all"])
+        if located or updated:
+            # Coordinates are rendered by every listing read
+            invalidate_listings(all_listings=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Located {located} listings and computed {updated} geocells."))
+
+    def apply_gazetteer(self, path):
+        """
+        Set the coordinates of unlocated listings with one UPDATE per
+        gazetteer row, served by the location index.
+        """
+        located = 0
+        with open(path, newline="") as f, transaction.atomic():
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    latitude = Decimal(row["latitude"])
+                    longitude = Decimal(row["longitude"])
+                    location = row["location"]
+                except (KeyError, TypeError, InvalidOperation):
+                    raise CommandError(
+                        f"{path}:{line}: expected location, latitude and "
+                        f"longitude columns")
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise CommandError(f"{path}:{line}: point out of range")
+                located += Listing.objects.filter(
+                    location=location, latitude__isnull=True,
+                ).update(latitude=latitude, longitude=longitude,
+                         geocell=geocell(latitude, longitude))
+        return located
+
+    def fill_geocells(self, batch_size, recompute):
+        """
+        Compute geocells of located listings in primary key order, one
+        batch per transaction.
+        """
+        listings = Listing.objects.filter(
+            latitude__isnull=False, longitude__isnull=False)
+        if not recompute:
+            listings = listings.filter(geocell__isnull=True)
+        listings = listings.order_by("pk").only(
+            "listing_id", "latitude", "longitude")
+
+        updated, last_pk = 0, None
+        while True:
+            page = listings if last_pk is None else listings.filter(pk__gt=last_pk)
+            batch = list(page[:batch_size])
+            if not batch:
+                return updated
+            for listing in batch:
+                listing.set_geocell()
+            with transaction.atomic():
+                Listing.objects.bulk_update(batch, ["geocell"])
+            updated += len(batch)
+            last_pk = batch[-1].pk
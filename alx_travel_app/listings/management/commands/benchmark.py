@@ -0,0 +1,249 @@
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from listings.chapa import reset_client
+from listings.fake_chapa import FakeChapaServer
+from listings.models import User, Listing, Booking, Payment
+from listings.serializers import ClaimsTokenObtainPairSerializer
+from ._benchmarking import lifted_throttles
+
+
+# Committed with the repository. It pins SQL query counts only, since
+# latency depends on the machine: save a baseline of your own to also
+# compare p95 latency.
+BASELINE_PATH = os.path.join(settings.BASE_DIR, "benchmark_baseline.json")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Benchmark every API route in-process and report latency "
+            "percentiles, throughput and SQL queries per request")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--route", action="append", default=None,
+            help="Only run the named route (repeatable)")
+        parser.add_argument(
+            "--cold-cache", action="store_true",
+            help="Defeat the listing response cache on every request")
+        parser.add_argument(
+            "--chapa-latency", type=float, default=0.0,
+            help="Seconds the fake Chapa server waits before answering")
+        parser.add_argument("--json", dest="json_path", default=None,
+                            help="Write the results to this file")
+        parser.add_argument(
+            "--baseline", nargs="?", const=BASELINE_PATH, default=None,
+            help="Fail if results regress past this stored baseline "
+                 f"(default: {os.path.basename(BASELINE_PATH)})")
+        parser.add_argument(
+            "--save-baseline", default=None,
+            help="Store the results as the new baseline")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed p95 latency regression over the baseline")
+
+    def handle(self, *args, **options):
+        with FakeChapaServer(latency=options["chapa_latency"]) as chapa:
+            previous_url = settings.CHAPA_BASE_URL
+            settings.CHAPA_BASE_URL = chapa.base_url
+            reset_client()
+            try:
+                # Everything the benchmark writes is rolled back, and one
+                # client's requests must not be refused by the rate limits
+                with transaction.atomic(), lifted_throttles():
+                    results = self.run_routes(options)
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                settings.CHAPA_BASE_URL = previous_url
+                reset_client()
+
+        self.report(results)
+        if options["json_path"]:
+            self.write(options["json_path"], results)
+        if options["save_baseline"]:
+            self.write(options["save_baseline"], results)
+        if options["baseline"]:
+            self.compare(options["baseline"], results, options["tolerance"])
+
+    def fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        host = User.objects.create_user(
+            username=f"bench-host-{suffix}", password="bench", role="host")
+        guest = User.objects.create_user(
+            username=f"bench-guest-{suffix}", password="bench", role="guest")
+        listing = Listing.objects.create(
+            host=host, name="Benchmark listing", description="benchmark",
+            location="Addis Ababa", latitude=9.03, longitude=38.74,
+            price_per_night=100)
+        booking = Booking.objects.create(
+            listing=listing, user=guest, total_price=0,
+            start_date=date(2099, 1, 1), end_date=date(2099, 1, 3))
+        payment = Payment.objects.create(
+            booking=booking, tx_ref=uuid.uuid4(), amount=booking.total_price)
+        return host, guest, listing, booking, payment
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            token = ClaimsTokenObtainPairSerializer.get_token(
+                user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def routes(self):
+        """
+        Return (name, client, method, path, body) factories per route.
+        Factories receive the iteration number so writes never collide.
+        """
+        host, guest, listing, booking, payment = self.fixtures()
+        anonymous = self.client_for(None)
+        guest_client = self.client_for(guest)
+        host_client = self.client_for(host)
+        stay = date(2100, 1, 1)
+
+        def new_booking(i):
+            start = stay + timedelta(days=2 * i)
+            return {"listing": str(listing.pk),
+                    "start_date": start.isoformat(),
+                    "end_date": (start + timedelta(days=1)).isoformat()}
+
+        return [
+            ("listings-list", anonymous, "get",
+             lambda i: "/api/listings", None),
+            ("listings-detail", anonymous, "get",
+             lambda i: f"/api/listings/{listing.pk}", None),
+            ("listings-search", anonymous, "get",
+             lambda i: ("/api/listings/search?location=Addis Ababa"
+                        "&max_price=200&check_in=2099-06-03"
+                        "&check_out=2099-06-09"), None),
+            ("listings-fulltext", anonymous, "get",
+             lambda i: "/api/listings/search?q=benchmark listing", None),
+            ("listings-nearby", anonymous, "get",
+             lambda i: "/api/listings/nearby?lat=9.03&lng=38.74&radius=10",
+             None),
+            ("listings-quote", anonymous, "get",
+             lambda i: (f"/api/listings/{listing.pk}/quote"
+                        "?check_in=2099-06-03&check_out=2099-06-09"), None),
+            ("listings-reviews", anonymous, "get",
+             lambda i: f"/api/listings/{listing.pk}/reviews", None),
+            ("reviews-list", anonymous, "get",
+             lambda i: "/api/reviews", None),
+            ("bookings-list", guest_client, "get",
+             lambda i: "/api/bookings", None),
+            ("bookings-host-list", host_client, "get",
+             lambda i: "/api/bookings", None),
+            ("bookings-detail", guest_client, "get",
+             lambda i: f"/api/bookings/{booking.pk}", None),
+            ("bookings-create", guest_client, "post",
+             lambda i: "/api/bookings", new_booking),
+            ("payments-initiate", guest_client, "post",
+             lambda i: "/api/payments/initiate/",
+             lambda i: {"booking": str(booking.pk)}),
+            ("payments-verify", guest_client, "get",
+             lambda i: f"/api/payments/verify/{payment.tx_ref}/", None),
+        ]
+
+    def run_routes(self, options):
+        selected = options["route"]
+        iterations = options["iterations"]
+        warmup = options["warmup"]
+        results = {}
+        for name, client, method, path, body in self.routes():
+            if selected and name not in selected:
+                continue
+            call = getattr(client, method)
+            timings, queries = [], []
+            for i in range(warmup + iterations):
+                kwargs = {"format": "json"}
+                url = path(i)
+                if body is not None:
+                    kwargs["data"] = body(i)
+                elif options["cold_cache"]:
+                    # A unique query string gets a fresh cache key
+                    separator = "&" if "?" in url else "?"
+                    url = f"{url}{separator}_bench={i}"
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = call(url, **kwargs)
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f"{name} returned {response.status_code}: "
+                        f"{getattr(response, 'data', '')}")
+                if i >= warmup:
+                    timings.append(elapsed * 1000)
+                    queries.append(len(captured))
+            results[name] = self.summarize(timings, queries)
+        return results
+
+    def summarize(self, timings, queries):
+        cuts = statistics.quantiles(timings, n=100, method="inclusive")
+        return {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3),
+            "rps": round(1000 * len(timings) / sum(timings), 1),
+            "queries": max(queries),
+        }
+
+    def report(self, results):
+        header = (f"{'route':<20} {'p50 ms':>9} {'p95 ms':>9} "
+                  f"{'p99 ms':>9} {'req/s':>9} {'queries':>8}")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<20} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['rps']:>9.1f} "
+                f"{row['queries']:>8}")
+
+    def write(self, path, results):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def compare(self, path, results, tolerance):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(
+                f"No baseline at {path}. Record one with "
+                f"`manage.py benchmark --save-baseline {path}`.")
+
+        failures = []
+        for name, row in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if row["queries"] > expected["queries"]:
+                failures.append(
+                    f"{name}: {row['queries']} queries "
+                    f"(baseline {expected['queries']})")
+            if "p95_ms" not in expected:
+                continue
+            limit = expected["p95_ms"] * (1 + tolerance)
+            if row["p95_ms"] > limit:
+                failures.append(
+                    f"{name}: p95 {row['p95_ms']:.2f} ms "
+                    f"(baseline {expected['p95_ms']:.2f} ms)")
+        if failures:
+            raise CommandError(
+                "Benchmark regressed:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,213 @@
+import asyncio
+import io
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from listings.chapa import reset_client
+from listings.fake_chapa import FakeChapaServer
+from listings.models import User, Listing, Booking, Payment
+from listings.serializers import ClaimsTokenObtainPairSerializer
+from ._benchmarking import lifted_throttles
+
+
+class Command(BaseCommand):
+    help = ("Fire bursts of concurrent requests at the WSGI and ASGI "
+            "handlers and compare throughput and latency")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--connections", type=int, default=1000,
+            help="Concurrent requests per burst")
+        parser.add_argument(
+            "--threads", type=int, default=32,
+            help="WSGI worker threads")
+        parser.add_argument(
+            "--chapa-latency", type=float, default=0.2,
+            help="Seconds the fake Chapa server waits before answering")
+
+    def handle(self, *args, **options):
+        # Requests run on other threads and connections, so the fixtures
+        # are committed for real and deleted afterwards
+        host, guest, payment = self.fixtures()
+        token = ClaimsTokenObtainPairSerializer.get_token(guest).access_token
+        authorization = f"Bearer {token}"
+        routes = [
+            ("listings-list", "/api/listings", "/api/async/listings", None),
+            ("payments-verify",
+             f"/api/payments/verify/{payment.tx_ref}/",
+             f"/api/async/payments/verify/{payment.tx_ref}/",
+             authorization),
+        ]
+
+        results = {}
+        with FakeChapaServer(latency=options["chapa_latency"]) as chapa:
+            previous_url = settings.CHAPA_BASE_URL
+            settings.CHAPA_BASE_URL = chapa.base_url
+            reset_client()
+            try:
+                # One guest sends every burst, well past the rate limits
+                with lifted_throttles():
+                    for name, wsgi_path, asgi_path, auth in routes:
+                        results[f"{name} wsgi"] = self.run_wsgi(
+                            wsgi_path, auth, options["connections"],
+                            options["threads"])
+                        results[f"{name} asgi"] = self.run_asgi(
+                            asgi_path, auth, options["connections"])
+            finally:
+                settings.CHAPA_BASE_URL = previous_url
+                reset_client()
+                User.objects.filter(pk__in=[host.pk, guest.pk]).delete()
+        self.report(results)
+
+    def fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        host = User.objects.create_user(
+            username=f"bench-host-{suffix}", password="bench", role="host")
+        guest = User.objects.create_user(
+            username=f"bench-guest-{suffix}", password="bench", role="guest")
+        listing = Listing.objects.create(
+            host=host, name="Benchmark listing", description="benchmark",
+            location="Addis Ababa", price_per_night=100)
+        booking = Booking.objects.create(
+            listing=listing, user=guest, total_price=0,
+            start_date=date(2099, 1, 1), end_date=date(2099, 1, 3))
+        # Already settled, so verification only waits on the gateway and
+        # the burst does not queue on database row locks
+        payment = Payment.objects.create(
+            booking=booking, tx_ref=uuid.uuid4(), amount=booking.total_price,
+            status=Payment.PaymentStatus.SUCCESS)
+        return host, guest, payment
+
+    def run_wsgi(self, path, authorization, count, threads):
+        """
+        Serve `count` requests, all queued at once, from a pool of
+        `threads` workers the way a threaded WSGI server would. Every
+        request has its own query string so none is a cache hit.
+        """
+        handler = WSGIHandler()
+
+        def call(args):
+            i, started = args
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": f"_bench={i}",
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "REMOTE_ADDR": "127.0.0.1",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": io.StringIO(),
+                "wsgi.url_scheme": "http",
+            }
+            if authorization:
+                environ["HTTP_AUTHORIZATION"] = authorization
+            statuses = []
+            response = handler(
+                environ, lambda status, headers: statuses.append(status))
+            try:
+                b"".join(response)
+            finally:
+                response.close()
+            return int(statuses[0].split()[0]), time.perf_counter() - started
+
+        def worker_done():
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            started = time.perf_counter()
+            outcomes = list(pool.map(
+                call, [(i, started) for i in range(count)]))
+            elapsed = time.perf_counter() - started
+            # Each worker thread opened its own database connection
+            for future in [pool.submit(worker_done) for _ in range(threads)]:
+                future.result()
+        return self.summarize(path, outcomes, elapsed)
+
+    def run_asgi(self, path, authorization, count):
+        """
+        Serve `count` requests at once on one event loop, the way an
+        ASGI server would.
+        """
+        handler = ASGIHandler()
+        headers = [(b"host", b"localhost")]
+        if authorization:
+            headers.append((b"authorization", authorization.encode()))
+
+        async def call(i, started):
+            finished = asyncio.Event()
+            statuses = []
+
+            async def receive():
+                if not statuses:
+                    statuses.append(None)
+                    return {"type": "http.request", "body": b"",
+                            "more_body": False}
+                # Keep the client connected until the response is sent
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+                elif not message.get("more_body"):
+                    finished.set()
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "root_path": "",
+                "query_string": f"_bench={i}".encode(),
+                "headers": headers,
+                "client": ("127.0.0.1", 0),
+                "server": ("localhost", 80),
+            }
+            await handler(scope, receive, send)
+            return statuses[1], time.perf_counter() - started
+
+        async def burst():
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(
+                *[call(i, started) for i in range(count)])
+            return outcomes, time.perf_counter() - started
+
+        outcomes, elapsed = asyncio.run(burst())
+        return self.summarize(path, outcomes, elapsed)
+
+    def summarize(self, path, outcomes, elapsed):
+        failed = [status for status, _ in outcomes if status >= 400]
+        if failed:
+            raise CommandError(
+                f"{path}: {len(failed)} of {len(outcomes)} requests failed "
+                f"(first status {failed[0]})")
+        timings = [seconds * 1000 for _, seconds in outcomes]
+        cuts = statistics.quantiles(timings, n=100, method="inclusive")
+        return {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3),
+            "rps": round(len(outcomes) / elapsed, 1),
+        }
+
+    def report(self, results):
+        header = (f"{'route':<22} {'p50 ms':>9} {'p95 ms':>9} "
+                  f"{'p99 ms':>9} {'req/s':>9}")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<22} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['rps']:>9.1f}")
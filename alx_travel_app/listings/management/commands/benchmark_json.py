@@ -0,0 +1,163 @@
+import io
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from listings.models import Booking, Listing
+from listings.renderers import ORJSONParser, ORJSONRenderer, orjson
+from listings.serializers import BookingSerializer, ListingSerializer
+
+
+# Values whose rendering must not change, beyond what the serializers emit
+COMPATIBILITY_CASES = {
+    "empty": {},
+    "scalars": [0, -1, 2 ** 63 - 1, -2 ** 63, 1.5, 0.1, 100.0, True, None],
+    "wide integers": [2 ** 64, -2 ** 70],
+    "text": ["plain", 'quote " backslash \\ slash /', "tab\tnewline\n",
+             "\x00\x1f\x7f", "Addis Abäba ☕ 😀", "line\u2028para\u2029"],
+    "datetimes": [
+        datetime(2025, 6, 3, 12, 30, tzinfo=dt_timezone.utc),
+        datetime(2025, 6, 3, 12, 30, 0, 250, tzinfo=dt_timezone.utc),
+        datetime(2025, 1, 3, 12, 30, tzinfo=ZoneInfo("Europe/London")),
+        datetime(2025, 6, 3, 12, 30, tzinfo=ZoneInfo("Africa/Addis_Ababa")),
+        datetime(2025, 6, 3, 12, 30, 1, 5),
+    ],
+    "dates and times": [date(2025, 6, 3), timedelta(days=2, seconds=5),
+                        datetime(2025, 6, 3, 1, 2, 3, 4).time()],
+    "decimals": [Decimal("100.50"), Decimal("0"), Decimal("-3.25")],
+    "uuids": {"listing_id": uuid.UUID(int=5), "pk": uuid.uuid4()},
+    "non-string keys": {1: "one", None: "none", True: "yes"},
+    "lazy text": [gettext_lazy("This field is required.")],
+    "errors": ReturnDict(
+        {"name": [ErrorDetail("This field is required.", code="required")]},
+        serializer=None),
+    "bytes and tuples": [b"raw", (1, 2), {"nested": ({"a": [()]},)}],
+}
+
+PARSE_CASES = [
+    b'{"listing": "8b1c", "start_date": "2025-06-03", "status": "pending"}',
+    '{"name": "Lake view ☕", "price_per_night": 100.5}'.encode(),
+    b'[1, -2, 3.25, 1e300, true, false, null, "\\u00e9\\ud83d\\ude00"]',
+    b'{"id": 123456789012345678901234567890}',
+    b'  {"a": 1, "a": 2}  ',
+    b'{"a": NaN}',
+    b'{"a": }',
+    b'',
+]
+
+
+class Command(BaseCommand):
+    help = ("Compare DRF's JSONRenderer/JSONParser with the orjson-backed "
+            "ones on real serializer output and check they agree")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument(
+            "--page-size", type=int, default=100,
+            help="Listings per rendered page")
+        parser.add_argument(
+            "--bookings", type=int, default=1000,
+            help="Bookings per rendered list and bulk request body")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed.")
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+
+        for name, data in COMPATIBILITY_CASES.items():
+            expected, actual = stdlib.render(data), fast.render(data)
+            if expected != actual:
+                raise CommandError(
+                    f"{name}: rendered {actual!r}, expected {expected!r}")
+        for body in PARSE_CASES:
+            expected, actual = self.parse(JSONParser(), body), self.parse(
+                ORJSONParser(), body)
+            if repr(expected) != repr(actual):
+                raise CommandError(
+                    f"{body!r}: parsed {actual!r}, expected {expected!r}")
+
+        payloads = self.payloads(options["page_size"], options["bookings"])
+        rounds = options["rounds"]
+        header = (f"{'payload':<22} {'bytes':>10} {'json ms':>9} "
+                  f"{'orjson ms':>10} {'speedup':>8}")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, data in payloads.items():
+            rendered = stdlib.render(data)
+            if fast.render(data) != rendered:
+                raise CommandError(f"{name}: orjson output differs")
+            self.row(f"render {name}", len(rendered),
+                     self.best(rounds, lambda: stdlib.render(data)),
+                     self.best(rounds, lambda: fast.render(data)))
+        for name in ("bookings", "listings page"):
+            body = stdlib.render(payloads[name])
+            if self.parse(ORJSONParser(), body) != self.parse(JSONParser(), body):
+                raise CommandError(f"{name}: orjson parse differs")
+            self.row(f"parse {name}", len(body),
+                     self.best(rounds, lambda: self.parse(JSONParser(), body)),
+                     self.best(rounds, lambda: self.parse(ORJSONParser(), body)))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(COMPATIBILITY_CASES) + len(payloads)} payloads render and "
+            f"{len(PARSE_CASES) + 2} bodies parse identically."))
+
+    def payloads(self, page_size, bookings):
+        listings = list(Listing.objects.prefetch_related("bookings")
+                        .order_by("-created_at", "-listing_id")[:page_size])
+        if not listings:
+            raise CommandError("No listings to render; run seed.")
+        booking_rows = list(Booking.objects.all()[:bookings])
+        first = date.today()
+        return {
+            "listings page": {
+                "next": "http://testserver/api/listings?cursor=cD0yMDI1",
+                "previous": None,
+                "results": ListingSerializer(listings, many=True).data,
+            },
+            "bookings": BookingSerializer(booking_rows, many=True).data,
+            # Native types, as the calendar and bulk routes respond
+            "calendar": {
+                "listing_id": listings[0].pk,
+                "from": first,
+                "to": first + timedelta(days=364),
+                "nights": [{
+                    "date": first + timedelta(days=offset),
+                    "available": offset % 3 != 0,
+                    "price": "100.00",
+                } for offset in range(365)],
+            },
+            "bulk response": {
+                "created": len(booking_rows),
+                "failed": 0,
+                "results": [
+                    {"index": index, "status": "created",
+                     "booking_id": booking.pk}
+                    for index, booking in enumerate(booking_rows)],
+            },
+        }
+
+    def parse(self, parser, body):
+        try:
+            return parser.parse(io.BytesIO(body), "application/json", {})
+        except ParseError as exc:
+            return f"ParseError: {exc.detail}"
+
+    def best(self, rounds, work):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            work()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def row(self, name, size, stdlib_ms, fast_ms):
+        self.stdout.write(
+            f"{name:<22} {size:>10,} {stdlib_ms:>9.2f} {fast_ms:>10.2f} "
+            f"{stdlib_ms / fast_ms:>7.1f}x")
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from listings.geo import cover, distance_km, within_radius
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = ("Measure nearby searches on the seeded listings and check them "
+            "against a full scan")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--radius", type=float, default=10.0,
+                            help="Search radius in km")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument(
+            "--verify", type=int, default=5,
+            help="Searches to repeat as a full scan and compare")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        located = Listing.objects.filter(geocell__isnull=False)
+        total = located.count()
+        if not total:
+            raise CommandError(
+                "No listings have coordinates; run seed or backfill_geocells.")
+
+        # Search around existing listings so most searches find some
+        rng = random.Random(options["seed"])
+        points = list(located.order_by("?").values_list(
+            "latitude", "longitude")[:options["queries"]])
+        radius = options["radius"]
+        page_size = options["page_size"]
+
+        timings, matches, candidates = [], [], []
+        for latitude, longitude in points:
+            latitude = float(latitude) + rng.uniform(-0.01, 0.01)
+            longitude = float(longitude) + rng.uniform(-0.01, 0.01)
+            started = time.perf_counter()
+            # What the endpoint runs: a count and the first page
+            results = within_radius(
+                Listing.objects.all(), latitude, longitude, radius)
+            matches.append(results.count())
+            list(results.values_list("pk", "distance_km")[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+            candidates.append(self.candidates(latitude, longitude, radius))
+
+        scan_timings = []
+        for latitude, longitude in points[:options["verify"]]:
+            latitude, longitude = float(latitude), float(longitude)
+            indexed = set(within_radius(
+                Listing.objects.all(), latitude, longitude, radius
+            ).values_list("pk", flat=True))
+            started = time.perf_counter()
+            scanned = set(located.annotate(
+                distance_km=distance_km(latitude, longitude)
+            ).filter(distance_km__lte=radius).values_list("pk", flat=True))
+            scan_timings.append((time.perf_counter() - started) * 1000)
+            if indexed != scanned:
+                raise CommandError(
+                    f"Search at ({latitude}, {longitude}) found "
+                    f"{len(indexed)} listings, the full scan {len(scanned)}")
+
+        cuts = statistics.quantiles(timings, n=100, method="inclusive")
+        self.stdout.write(f"listings with coordinates: {total:>12,}")
+        self.stdout.write(f"radius:                    {radius:>12,.1f} km")
+        self.stdout.write(
+            f"cell candidates per search: {statistics.mean(candidates):>11,.0f}")
+        self.stdout.write(
+            f"matches per search:        {statistics.mean(matches):>12,.0f}")
+        self.stdout.write(
+            f"indexed p50 / p95:         {statistics.median(timings):>9.2f} / "
+            f"{cuts[94]:.2f} ms")
+        self.stdout.write(
+            f"indexed throughput:        {1000 * len(timings) / sum(timings):>12,.1f} searches/s")
+        if scan_timings:
+            self.stdout.write(
+                f"full scan p50:             {statistics.median(scan_timings):>9.2f} ms")
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(scan_timings)} searches match the full scan."))
+
+    def candidates(self, latitude, longitude, radius):
+        """
+        Count the listings the cell ranges let through.
+        """
+        ranges = cover(latitude, longitude, radius)
+        if ranges is None:
+            return Listing.objects.filter(geocell__isnull=False).count()
+        cells = Q()
+        for low, high in ranges:
+            cells |= Q(geocell__gte=low, geocell__lt=high)
+        return Listing.objects.filter(cells).count()
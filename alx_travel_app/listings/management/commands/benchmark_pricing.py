@@ -0,0 +1,87 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.pricing import WEEKEND_NIGHTS, RateCard
+
+
+def nightly_reference(card, start_date, end_date):
+    """
+    Price a stay night by night; the engine must agree with this.
+    """
+    total = Decimal(0)
+    day = start_date
+    while day < end_date:
+        price, weekend_price = card.price_per_night, card.weekend_price_per_night
+        for season_start, season_end, season_price, season_weekend in card.seasons:
+            if season_start <= day < season_end:
+                price = season_price
+                weekend_price = (season_price if season_weekend is None
+                                 else season_weekend)
+        total += weekend_price if day.weekday() in WEEKEND_NIGHTS else price
+        day += timedelta(days=1)
+    return total
+
+
+class Command(BaseCommand):
+    help = ("Measure stay quotes per second on synthetic rate cards and "
+            "check them against night-by-night pricing")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stays", type=int, default=20000)
+        parser.add_argument("--listings", type=int, default=500)
+        parser.add_argument("--seasons", type=int, default=4,
+                            help="Seasons per listing")
+        parser.add_argument("--max-nights", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        first_day = date(2030, 1, 1)
+
+        cards = []
+        for _ in range(options["listings"]):
+            base = Decimal(rng.randint(50, 500))
+            seasons, day = [], first_day
+            for _ in range(options["seasons"]):
+                day += timedelta(days=rng.randint(0, 60))
+                end = day + timedelta(days=rng.randint(7, 90))
+                price = base * Decimal(rng.choice(["0.8", "1.2", "1.5"]))
+                seasons.append((day, end, price, price + 20))
+                day = end
+            cards.append(RateCard(
+                base, base + 25, rng.randint(0, 50), seasons,
+                [(7, Decimal(10)), (28, Decimal(25))]))
+
+        stays = []
+        for _ in range(options["stays"]):
+            start = first_day + timedelta(days=rng.randint(0, 365))
+            nights = rng.randint(1, options["max_nights"])
+            stays.append((rng.choice(cards), start,
+                          start + timedelta(days=nights)))
+
+        started = time.perf_counter()
+        quotes = [card.quote(start, end) for card, start, end in stays]
+        engine_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = [nightly_reference(card, start, end)
+                    for card, start, end in stays]
+        reference_seconds = time.perf_counter() - started
+
+        mismatches = sum(
+            1 for quote, total in zip(quotes, expected)
+            if quote["nightly_total"] != total)
+        if mismatches:
+            raise CommandError(
+                f"{mismatches} quotes disagree with night-by-night pricing")
+
+        count = len(stays)
+        self.stdout.write(
+            f"engine:         {count / engine_seconds:>12,.0f} quotes/s")
+        self.stdout.write(
+            f"night by night: {count / reference_seconds:>12,.0f} quotes/s")
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} quotes match night-by-night pricing."))
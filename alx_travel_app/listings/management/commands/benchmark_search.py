@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from listings.models import BookedNight, Booking, Listing, User
+
+
+# Every booking of a listing starts in its own week, so they never overlap
+SLOT_DAYS = 7
+FIRST_NIGHT = date(2100, 1, 1)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Measure availability searches as the bookings per listing grow "
+            "and check them against the generated bookings")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument(
+            "--bookings-per-listing", default="0,10,100,500",
+            help="Comma-separated booking counts per listing to sweep")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument(
+            "--verify", type=int, default=5,
+            help="Searches per step to check against the generated bookings")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            steps = sorted({int(n) for n in
+                            options["bookings_per_listing"].split(",")})
+        except ValueError:
+            raise CommandError("--bookings-per-listing takes integers")
+        self.rng = random.Random(options["seed"])
+
+        # Everything the benchmark writes is rolled back
+        results = []
+        try:
+            with transaction.atomic():
+                self.fixtures(options["listings"])
+                for per_listing in steps:
+                    self.book_up_to(per_listing)
+                    results.append(
+                        (per_listing, *self.measure(per_listing, options)))
+                raise Rollback
+        except Rollback:
+            pass
+
+        header = (f"{'bookings/listing':>16} {'bookings':>12} {'nights':>12} "
+                  f"{'p50 ms':>8} {'p95 ms':>8} {'matches':>8}")
+        self.stdout.write(f"{options['listings']:,} listings, "
+                          f"{options['queries']} searches per step")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for per_listing, bookings, nights, p50, p95, matches in results:
+            self.stdout.write(
+                f"{per_listing:>16,} {bookings:>12,} {nights:>12,} "
+                f"{p50:>8.2f} {p95:>8.2f} {matches:>8.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            "Searches match the generated bookings at every step."))
+
+    def fixtures(self, count):
+        suffix = uuid.uuid4().hex[:8]
+        host = User.objects.create(
+            username=f"bench-host-{suffix}", role="host")
+        self.location = f"Benchmark {suffix}"
+        self.listings = Listing.objects.bulk_create(
+            Listing(host=host, name=f"Benchmark listing {i}",
+                    description="benchmark", location=self.location,
+                    price_per_night=50 + i % 200)
+            for i in range(count))
+        self.host = host
+        # {listing_id: [(start_date, end_date)]}
+        self.stays = {listing.pk: [] for listing in self.listings}
+
+    def book_up_to(self, per_listing):
+        bookings = []
+        for listing in self.listings:
+            stays = self.stays[listing.pk]
+            for slot in range(len(stays), per_listing):
+                start = FIRST_NIGHT + timedelta(
+                    days=slot * SLOT_DAYS + self.rng.randrange(3))
+                end = start + timedelta(days=self.rng.randint(1, 4))
+                stays.append((start, end))
+                bookings.append(Booking(
+                    listing_id=listing.pk, user_id=self.host.pk,
+                    start_date=start, end_date=end, total_price=0))
+        for start in range(0, len(bookings), 5000):
+            batch = bookings[start:start + 5000]
+            Booking.objects.bulk_create(batch)
+            BookedNight.reserve(batch)
+
+    def window(self, per_listing):
+        span = max(per_listing, 1) * SLOT_DAYS
+        check_in = FIRST_NIGHT + timedelta(days=self.rng.randrange(span))
+        return check_in, check_in + timedelta(days=self.rng.randint(1, 7))
+
+    def search(self, check_in, check_out, max_price):
+        """
+        What the search endpoint runs for a dated query: the location and
+        price filter, the calendar anti-join and the first cursor page.
+        """
+        taken = BookedNight.objects.filter(
+            listing=OuterRef('pk')).between(check_in, check_out)
+        return (Listing.objects
+                .filter(location=self.location,
+                        price_per_night__lte=max_price)
+                .filter(~Exists(taken))
+                .order_by('-created_at', '-listing_id'))
+
+    def measure(self, per_listing, options):
+        page_size = options["page_size"]
+        timings, matches = [], []
+        for _ in range(options["queries"]):
+            check_in, check_out = self.window(per_listing)
+            started = time.perf_counter()
+            page = list(self.search(check_in, check_out, 200)
+                        .values_list('pk', flat=True)[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+            matches.append(len(page))
+
+        for _ in range(options["verify"]):
+            check_in, check_out = self.window(per_listing)
+            found = set(self.search(check_in, check_out, 200)
+                        .values_list('pk', flat=True))
+            expected = {
+                listing.pk for listing in self.listings
+                if listing.price_per_night <= 200
+                and not any(start < check_out and end > check_in
+                            for start, end in self.stays[listing.pk])}
+            if found != expected:
+                raise CommandError(
+                    f"{per_listing} bookings per listing, {check_in} to "
+                    f"{check_out}: found {len(found)} free listings, "
+                    f"expected {len(expected)}")
+
+        cuts = statistics.quantiles(timings, n=100, method="inclusive")
+        return (per_listing * len(self.listings),
+                BookedNight.objects.filter(
+                    listing__location=self.location).count(),
+                statistics.median(timings), cuts[94],
+                statistics.mean(matches))
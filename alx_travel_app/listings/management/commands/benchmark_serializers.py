@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from listings.fieldsets import only_columns, render_values, value_renderers
+from listings.models import Booking, Listing
+from listings.serializers import BookingSerializer, ListingSummarySerializer
+
+
+class Command(BaseCommand):
+    help = ("Measure the per-object cost of rendering listings and bookings "
+            "with full serializers, sparse fieldsets and .values() rows")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument(
+            "--fields", default="listing_id,name,location,price_per_night",
+            help="Sparse listing fieldset to compare")
+
+    def handle(self, *args, **options):
+        rows, rounds = options["rows"], options["rounds"]
+        listing_fields = options["fields"].split(",")
+        cases = [
+            ("listings", ListingSummarySerializer,
+             Listing.objects.order_by("-created_at", "-listing_id"), None),
+            ("listings ?fields=", ListingSummarySerializer,
+             Listing.objects.order_by("-created_at", "-listing_id"),
+             listing_fields),
+            ("bookings", BookingSerializer,
+             Booking.objects.all(), None),
+        ]
+
+        header = (f"{'case':<20} {'path':<12} {'fetch+render':>14} "
+                  f"{'render':>10}")
+        self.stdout.write(f"{rows} rows, best of {rounds} rounds, µs per object")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, serializer_class, queryset, fields in cases:
+            serializer = serializer_class(fields=fields)
+            queryset = queryset[:rows]
+            columns = only_columns(serializer)
+            if fields is not None and columns is not None:
+                instances = queryset.only(*columns)
+            else:
+                instances = queryset
+            columns, renderers = value_renderers(serializer)
+            values = queryset.values(*columns)
+
+            def serialize(objects):
+                return serializer_class(objects, many=True, fields=fields).data
+
+            def render(page):
+                return render_values(page, renderers)
+
+            loaded = list(instances)
+            if not loaded:
+                raise CommandError(f"No {name.split()[0]} to render; run seed.")
+            expected = JSONRenderer().render(serialize(loaded))
+            if JSONRenderer().render(render(list(values))) != expected:
+                raise CommandError(
+                    f"{name}: .values() rendering differs from the serializer")
+
+            count = len(loaded)
+            for path, fetch, encode in (
+                    ("serializer", instances, serialize),
+                    ("values", values, render)):
+                full = self.best(rounds, lambda: encode(list(fetch.all())))
+                page = list(fetch.all())
+                only = self.best(rounds, lambda: encode(page))
+                self.stdout.write(
+                    f"{name:<20} {path:<12} {full / count * 1e6:>14.1f} "
+                    f"{only / count * 1e6:>10.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            "The .values() path renders the same JSON as the serializers."))
+
+    def best(self, rounds, work):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            work()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
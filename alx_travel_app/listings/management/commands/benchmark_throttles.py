@@ -0,0 +1,122 @@
+import time
+import uuid
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+from listings.models import User
+from listings.throttles import AnonTokenBucketThrottle, UserTokenBucketThrottle
+
+
+class Clock:
+    """
+    Stand-in for the throttle timer, moved by hand.
+    """
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class Command(BaseCommand):
+    help = ("Check the token-bucket throttles admit bursts and refill at "
+            "their rate, and measure their cost per request")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=10000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        calls, rounds = options["calls"], options["rounds"]
+        factory = APIRequestFactory()
+        keys = []
+
+        def throttle(base, rate, clock, user=None, ip="203.0.113.7"):
+            throttle_class = type("BenchmarkThrottle", (base,), {
+                "scope": "benchmark", "rate": rate})
+            instance = throttle_class()
+            instance.timer = clock
+            request = factory.get("/api/listings", REMOTE_ADDR=ip)
+            request.user = user or User(pk=uuid.uuid4())
+            keys.append(instance.get_cache_key(request, None))
+            return instance, request
+
+        try:
+            self.check_bucket(throttle)
+            self.stdout.write(
+                f"{caches['default'].__class__.__name__}, {calls} calls, "
+                f"best of {rounds} rounds, µs per request")
+            header = f"{'path':<34} {'µs':>8}"
+            self.stdout.write(header)
+            self.stdout.write("-" * len(header))
+            for name, case in (
+                    ("admitted, tokens left", self.admitted),
+                    ("admitted, bucket refilled", self.refilled),
+                    ("refused", self.refused),
+                    ("admitted, anonymous by IP", self.anonymous)):
+                per_call = self.best(rounds, calls, case(throttle, calls))
+                self.stdout.write(f"{name:<34} {per_call * 1e6:>8.2f}")
+        finally:
+            caches["default"].delete_many([key for key in keys if key])
+        self.stdout.write(self.style.SUCCESS(
+            "Bursts and refills follow the configured rate."))
+
+    def check_bucket(self, throttle):
+        clock = Clock()
+        bucket, request = throttle(UserTokenBucketThrottle, "10/s", clock)
+        admitted = sum(bucket.allow_request(request, None) for _ in range(11))
+        if admitted != 10:
+            raise CommandError(f"A fresh bucket admitted {admitted} of 11, "
+                               "expected its 10 tokens")
+        if abs(bucket.wait() - 0.1) > 1e-6:
+            raise CommandError(f"Retry after {bucket.wait()}s, expected 0.1s")
+        clock.now += 0.05
+        if bucket.allow_request(request, None):
+            raise CommandError("Admitted a request before a token refilled")
+        clock.now += 0.05
+        if not bucket.allow_request(request, None):
+            raise CommandError("Refused a request after a token refilled")
+        clock.now += 60
+        admitted = sum(bucket.allow_request(request, None) for _ in range(20))
+        if admitted != 10:
+            raise CommandError(f"An idle bucket admitted {admitted} of 20, "
+                               "expected a full burst of 10")
+
+    def admitted(self, throttle, calls):
+        # Enough tokens for every call, with the clock held still
+        bucket, request = throttle(
+            UserTokenBucketThrottle, f"{calls * 100}/day", Clock())
+        return lambda: bucket.allow_request(request, None)
+
+    def refilled(self, throttle, calls):
+        clock = Clock()
+        bucket, request = throttle(UserTokenBucketThrottle, "10/s", clock)
+
+        def step():
+            clock.now += 1
+            return bucket.allow_request(request, None)
+        return step
+
+    def refused(self, throttle, calls):
+        bucket, request = throttle(UserTokenBucketThrottle, "1/day", Clock())
+        bucket.allow_request(request, None)
+        return lambda: not bucket.allow_request(request, None)
+
+    def anonymous(self, throttle, calls):
+        bucket, request = throttle(
+            AnonTokenBucketThrottle, f"{calls * 100}/day", Clock(),
+            user=AnonymousUser())
+        return lambda: bucket.allow_request(request, None)
+
+    def best(self, rounds, calls, step):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(calls):
+                if not step():
+                    raise CommandError("A throttle took the wrong path")
+            timings.append(time.perf_counter() - started)
+        return min(timings) / calls
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from listings.cache import invalidate_listings
+from listings.models import BookedNight, Booking, BookingStatus
+
+
+class Command(BaseCommand):
+    help = "Rebuild the nightly availability calendar from bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        bookings = (Booking.objects.order_by()
+                    .exclude(status=BookingStatus.CANCELLED)
+                    .only('booking_id', 'listing_id', 'start_date',
+                          'end_date', 'status')
+                    .iterator(chunk_size=batch_size))
+
+        expected = 0
+        with transaction.atomic():
+            BookedNight.objects.all().delete()
+            batch = []
+            for booking in bookings:
+                batch.append(booking)
+                expected += (booking.end_date - booking.start_date).days
+                if len(batch) >= batch_size:
+                    # Older data may hold overlapping bookings; the
+                    # first one stored keeps the night
+                    BookedNight.reserve(batch, ignore_conflicts=True)
+                    batch = []
+            BookedNight.reserve(batch, ignore_conflicts=True)
+            stored = BookedNight.objects.count()
+            # Calendars and dated searches read the rebuilt nights
+            invalidate_listings(all_listings=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the availability calendar: {stored} booked nights."))
+        if stored < expected:
+            self.stderr.write(
+                f"{expected - stored} nights belong to overlapping "
+                f"bookings and were skipped.")
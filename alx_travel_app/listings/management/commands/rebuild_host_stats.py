@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from listings.models import (
+    Booking,
+    ListingMonthlyStats,
+    Payment,
+    host_stats_totals,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-listing monthly host stats from bookings and payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # Stream the rows instead of loading model instances
+        bookings = (Booking.objects.order_by()
+                    .values_list('listing_id', 'start_date', 'end_date', 'status')
+                    .iterator(chunk_size=batch_size))
+        payments = (Payment.objects.order_by()
+                    .filter(status=Payment.PaymentStatus.SUCCESS)
+                    .values_list('booking__listing_id',
+                                 'booking__start_date', 'amount')
+                    .iterator(chunk_size=batch_size))
+        totals = host_stats_totals(bookings, payments)
+
+        stats = [
+            ListingMonthlyStats(listing_id=listing_id, month=month, **fields)
+            for (listing_id, month), fields in totals.items()]
+
+        with transaction.atomic():
+            ListingMonthlyStats.objects.all().delete()
+            ListingMonthlyStats.objects.bulk_create(
+                stats, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt host stats: {len(stats)} listing months."))
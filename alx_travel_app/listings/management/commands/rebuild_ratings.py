@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from listings.cache import invalidate_listings
+from listings.models import Listing, Review
+
+
+class Command(BaseCommand):
+    help = "Rebuild listing rating aggregates from reviews in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # One GROUP BY pass over the reviews
+        histograms = {}
+        rows = (Review.objects.order_by()
+                .values_list('listing_id', 'rating')
+                .annotate(count=Count('pk')))
+        for listing_id, rating, count in rows:
+            histograms.setdefault(listing_id, [0] * 5)[rating - 1] = count
+
+        fields = Listing.RATING_FIELDS + ['avg_rating', 'review_count']
+        listings = []
+        for listing_id, histogram in histograms.items():
+            review_count = sum(histogram)
+            weighted = sum(
+                stars * count
+                for stars, count in enumerate(histogram, start=1))
+            listing = Listing(
+                listing_id=listing_id,
+                review_count=review_count,
+                avg_rating=round(weighted / review_count, 2))
+            for column, count in zip(Listing.RATING_FIELDS, histogram):
+                setattr(listing, column, count)
+            listings.append(listing)
+
+        with transaction.atomic():
+            Listing.objects.update(
+                avg_rating=0, review_count=0,
+                **{column: 0 for column in Listing.RATING_FIELDS})
+            Listing.objects.bulk_update(
+                listings, fields, batch_size=options["batch_size"])
+            invalidate_listings(all_listings=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates for {len(listings)} listings."))
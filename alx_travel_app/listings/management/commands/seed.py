@@ -1,103 +1,204 @@
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
-from django_seed import Seed
-from listings.models import User, Listing, Booking, Review
+from django.db import transaction
+from faker import Faker
+from listings.cache import invalidate_listings
+from listings.models import (
+    BookedNight,
+    Booking,
+    BookingStatus,
+    Listing,
+    ListingMonthlyStats,
+    Review,
+    User,
+    host_stats_totals,
+)
 import random
 from datetime import timedelta, date
+from decimal import Decimal
 import uuid
 
 
 class Command(BaseCommand):
     help = "Seed database with sample data"
 
-    def handle(self, *args, **kwargs):
-        seeder = Seed.seeder()
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--host-ratio", type=float, default=0.4)
+        parser.add_argument("--listings", type=int, default=10)
+        parser.add_argument("--bookings-per-listing", type=int, default=1)
+        parser.add_argument("--reviews-per-listing", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--password", default="pass123")
+        parser.add_argument(
+            "--seed", type=int, default=None,
+            help="Seed the random generators for reproducible data. Ids "
+                 "and usernames stay unique on every run")
+        parser.add_argument(
+            "--start-date", type=date.fromisoformat, default=None,
+            help="First day of the booking calendars (default: tomorrow)")
 
-        # Create Users
-        seeder.add_entity(User, 2, {
-            "user_id": lambda x: uuid.uuid4(),
-            "username": lambda x: seeder.faker.user_name(),
-            "first_name": lambda x: seeder.faker.first_name(),
-            "last_name": lambda x: seeder.faker.last_name(),
-            "email": lambda x: seeder.faker.unique.email(),
-            "password": lambda x: "pass123",
-            "phone_number": lambda x: seeder.faker.phone_number(),
-            "role": lambda x: "host",
-            "created_at": lambda x: seeder.faker.date_time_this_year(),
-        })
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        self.start_date = (options["start_date"]
+                           or date.today() + timedelta(days=1))
 
-        seeder.add_entity(User, 2, {
-            "user_id": lambda x: uuid.uuid4(),
-            "username": lambda x: seeder.faker.user_name(),
-            "first_name": lambda x: seeder.faker.first_name(),
-            "last_name": lambda x: seeder.faker.last_name(),
-            "email": lambda x: seeder.faker.unique.email(),
-            "password": lambda x: "pass123",
-            "phone_number": lambda x: seeder.faker.phone_number(),
-            "role": lambda x: "guest",
-            "created_at": lambda x: seeder.faker.date_time_this_year(),
-        })
+        faker = Faker()
+        faker.seed_instance(options["seed"])
+        # Draw text from small pools; calling Faker per row dominates
+        # the run time on large datasets
+        self.first_names = [faker.first_name() for _ in range(500)]
+        self.last_names = [faker.last_name() for _ in range(500)]
+        self.cities = [faker.city() for _ in range(200)]
+        self.city_points = [
+            (self.rng.uniform(-55, 70), self.rng.uniform(-179, 179))
+            for _ in self.cities]
+        self.descriptions = [
+            faker.text(max_nb_chars=200) for _ in range(500)]
+        self.comments = [faker.sentence(nb_words=12) for _ in range(500)]
 
-        seeder.add_entity(User, 1, {
-            "user_id": lambda x: uuid.uuid4(),
-            "username": lambda x: seeder.faker.user_name(),
-            "first_name": lambda x: seeder.faker.first_name(),
-            "last_name": lambda x: seeder.faker.last_name(),
-            "email": lambda x: seeder.faker.unique.email(),
-            "password": lambda x: "pass123",
-            "phone_number": lambda x: seeder.faker.phone_number(),
-            "role": lambda x: "admin",
-            "created_at": lambda x: seeder.faker.date_time_this_year(),
-        })
+        hosts, guests = self.create_users(
+            options["users"], options["host_ratio"], options["password"])
+        if not hosts or not guests:
+            self.stderr.write("Need at least one host and one guest.")
+            return
 
-        inserted = seeder.execute()
+        listings, bookings, reviews = self.create_listings(
+            options["listings"], hosts, guests,
+            options["bookings_per_listing"], options["reviews_per_listing"])
+        invalidate_listings()
 
-        # Hash passwords for all created users
-        for user_id in inserted[User]:
-            user = User.objects.get(pk=user_id)
-            user.set_password("pass123")
-            user.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Database seeded successfully! {options['users']} users, "
+            f"{listings} listings, {bookings} bookings, {reviews} reviews. "
+            f"Passwords hashed."))
 
-        # Fetch created users
-        users = list(User.objects.all())
-        hosts = [u for u in users if u.role == "host"]
-        guests = [u for u in users if u.role == "guest"]
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield range(start, min(start + self.chunk_size, total))
 
-        # Create Listings for hosts
-        for i in range(10):
-            listing = Listing.objects.create(
-                listing_id=uuid.uuid4(),
-                host=random.choice(hosts),
-                name=f"Property {i+1}",
-                description=seeder.faker.text(max_nb_chars=200),
-                location=seeder.faker.city(),
-                price_per_night=random.randint(50, 500),
-                created_at=seeder.faker.date_time_this_year(),
-                updated_at=seeder.faker.date_time_this_year(),
-            )
+    def create_users(self, count, host_ratio, password):
+        """
+        Create one admin, then hosts and guests. The password is hashed
+        once and the hash shared by every seeded user.
+        """
+        password = make_password(password)
+        # Keep usernames unique across repeated runs on the same
+        # database, whatever --seed is
+        run_tag = uuid.uuid4().hex[:8]
+        host_count = max(1, int(count * host_ratio))
+        hosts, guests = [], []
+        for chunk in self.chunks(count):
+            users = []
+            for i in chunk:
+                if i == 0:
+                    role = "admin"
+                elif i <= host_count:
+                    role = "host"
+                else:
+                    role = "guest"
+                users.append(User(
+                    username=f"user{i}_{run_tag}",
+                    first_name=self.rng.choice(self.first_names),
+                    last_name=self.rng.choice(self.last_names),
+                    email=f"user{i}_{run_tag}@example.com",
+                    password=password,
+                    phone_number=f"+2519{self.rng.randrange(10**8):08d}",
+                    role=role,
+                ))
+            User.objects.bulk_create(users, batch_size=self.chunk_size)
+            hosts += [u.pk for u in users if u.role == "host"]
+            guests += [u.pk for u in users if u.role == "guest"]
+        return hosts, guests
 
-            # Create Booking for each listing
-            guest = random.choice(guests)
-            start = date.today() + timedelta(days=random.randint(1, 30))
-            end = start + timedelta(days=random.randint(2, 7))
-            Booking.objects.create(
-                booking_id=uuid.uuid4(),
+    def create_listings(self, count, hosts, guests,
+                        bookings_per_listing, reviews_per_listing):
+        """
+        Create listings with non-overlapping booking calendars and
+        reviews, chunk by chunk. Rating aggregates are computed in memory,
+        and the calendar and host stats are written for the new listings
+        only, so no rebuild pass over existing data is needed afterwards.
+        """
+        totals = [0, 0, 0]
+        for chunk in self.chunks(count):
+            listings, bookings, reviews = [], [], []
+            for i in chunk:
+                city = self.rng.randrange(len(self.cities))
+                latitude, longitude = self.city_points[city]
+                listing = Listing(
+                    host_id=self.rng.choice(hosts),
+                    name=f"Property {i + 1}",
+                    description=self.rng.choice(self.descriptions),
+                    location=self.cities[city],
+                    # Scattered within ~10 km of the city centre
+                    latitude=round(latitude + self.rng.uniform(-0.1, 0.1), 6),
+                    longitude=round(longitude + self.rng.uniform(-0.1, 0.1), 6),
+                    price_per_night=Decimal(self.rng.randint(50, 500)),
+                )
+                listing.set_geocell()
+                listings.append(listing)
+                bookings += self.booking_calendar(
+                    listing, guests, bookings_per_listing)
+                reviews += self.listing_reviews(
+                    listing, guests, reviews_per_listing)
+
+            with transaction.atomic():
+                Listing.objects.bulk_create(
+                    listings, batch_size=self.chunk_size)
+                Booking.objects.bulk_create(
+                    bookings, batch_size=self.chunk_size)
+                # bulk_create skips Booking.save
+                BookedNight.reserve(bookings)
+                ListingMonthlyStats.objects.bulk_create(
+                    (ListingMonthlyStats(
+                        listing_id=listing_id, month=month, **fields)
+                     for (listing_id, month), fields in host_stats_totals(
+                        ((b.listing_id, b.start_date, b.end_date, b.status)
+                         for b in bookings), ()).items()),
+                    batch_size=self.chunk_size)
+                Review.objects.bulk_create(
+                    reviews, batch_size=self.chunk_size)
+            totals[0] += len(listings)
+            totals[1] += len(bookings)
+            totals[2] += len(reviews)
+        return totals
+
+    def booking_calendar(self, listing, guests, count):
+        bookings = []
+        start = self.start_date
+        for _ in range(count):
+            start += timedelta(days=self.rng.randint(0, 10))
+            nights = self.rng.randint(1, 7)
+            end = start + timedelta(days=nights)
+            bookings.append(Booking(
                 listing=listing,
-                user=guest,
+                user_id=self.rng.choice(guests),
                 start_date=start,
                 end_date=end,
-                total_price=(listing.price_per_night * (end - start).days),
-                status=random.choice(["pending", "confirmed", "cancelled"]),
-                created_at=seeder.faker.date_time_this_year(),
-            )
+                total_price=listing.price_per_night * nights,
+                status=self.rng.choices(
+                    BookingStatus.values, weights=[2, 7, 1])[0],
+            ))
+            start = end
+        return bookings
 
-            # Create Review for each listing
-            Review.objects.create(
-                review_id=uuid.uuid4(),
+    def listing_reviews(self, listing, guests, count):
+        reviews = []
+        for _ in range(count):
+            rating = self.rng.randint(1, 5)
+            field = Listing.RATING_FIELDS[rating - 1]
+            setattr(listing, field, getattr(listing, field) + 1)
+            reviews.append(Review(
                 listing=listing,
-                user=guest,
-                rating=random.randint(1, 5),
-                comment=seeder.faker.sentence(nb_words=12),
-                created_at=seeder.faker.date_time_this_year(),
-            )
-
-        self.stdout.write(self.style.SUCCESS("Database seeded successfully! Passwords hashed."))
+                user_id=self.rng.choice(guests),
+                rating=rating,
+                comment=self.rng.choice(self.comments),
+            ))
+        listing.review_count = count
+        if count:
+            weighted = sum(
+                stars * getattr(listing, column)
+                for stars, column in enumerate(Listing.RATING_FIELDS, start=1))
+            listing.avg_rating = round(Decimal(weighted) / count, 2)
+        return reviews
@@ -0,0 +1,76 @@
+"""
+Prometheus metrics for bookings, payments and the Chapa gateway.
+
+Metrics live in the default prometheus_client registry. When the
+PROMETHEUS_MULTIPROC_DIR environment variable points to a shared,
+writable directory, every worker writes its samples there and `/metrics`
+aggregates them across processes. Gunicorn should then call
+`prometheus_client.multiprocess.mark_process_dead(worker.pid)` from its
+`child_exit` hook.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+
+BOOKINGS_CREATED = Counter(
+    'bookings_created_total',
+    'Bookings created through the API')
+BOOKING_CONFLICTS = Counter(
+    'booking_conflicts_total',
+    'Booking attempts rejected because the dates overlap')
+PAYMENT_INITIATIONS = Counter(
+    'payment_initiations_total',
+    'Checkout initiations by outcome',
+    ['outcome'])
+PAYMENT_VERIFICATIONS = Counter(
+    'payment_verifications_total',
+    'Payment verifications by outcome',
+    ['outcome'])
+THROTTLED_REQUESTS = Counter(
+    'throttled_requests_total',
+    'Requests refused by a rate limit, by throttle scope',
+    ['scope'])
+CHAPA_REQUEST_SECONDS = Histogram(
+    'chapa_request_duration_seconds',
+    'Latency of calls to the Chapa API',
+    ['operation', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+def metrics_view(request):
+    """
+    Prometheus exposition endpoint.
+
+    Scrapers must send METRICS_AUTH_TOKEN as a bearer token. Without a
+    token the endpoint is only served with DEBUG on, and is a 404
+    otherwise, so a deployment that forgot it does not publish its
+    counters.
+    """
+    token = settings.METRICS_AUTH_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseNotFound()
+    elif not hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
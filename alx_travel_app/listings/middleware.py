@@ -0,0 +1,179 @@
+"""
+Opt-in per-request profiling.
+
+Enable with REQUEST_PROFILING=True. For every request the middleware
+records the number of SQL queries and the time spent in the database,
+in the view (serializers, permissions and queries), in rendering, and
+the response size. It adds a `Server-Timing` header and keeps
+per-view aggregates that admins can read from `/api/metrics/requests/`.
+Queries slower than SLOW_QUERY_MS are logged with the line of project
+code that issued them.
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+PROJECT_ROOT = str(settings.BASE_DIR)
+THIS_FILE = os.path.abspath(__file__)
+
+
+class ViewStats:
+    """
+    Running aggregates for one view.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.view_ms = 0.0
+        self.render_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.response_bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add(self, profile):
+        self.count += 1
+        self.total_ms += profile.total_ms
+        self.db_ms += profile.db_ms
+        self.view_ms += profile.view_ms
+        self.render_ms += profile.render_ms
+        self.queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.response_bytes += profile.response_bytes
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if profile.total_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / count, 3),
+            'avg_db_ms': round(self.db_ms / count, 3),
+            'avg_view_ms': round(self.view_ms / count, 3),
+            'avg_render_ms': round(self.render_ms / count, 3),
+            'avg_queries': round(self.queries / count, 2),
+            'max_queries': self.max_queries,
+            'avg_response_bytes': round(self.response_bytes / count),
+            'latency_ms_buckets': {
+                ('+Inf' if bound == float('inf') else str(bound)): hits
+                for bound, hits in zip(LATENCY_BUCKETS_MS, self.buckets)},
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def request_stats():
+    """
+    Return the aggregates of this process, keyed by view name.
+    """
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.view_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self.response_bytes = 0
+        self.view_started = None
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            if elapsed >= settings.SLOW_QUERY_MS:
+                logger.warning(
+                    "Slow query (%.1f ms) from %s: %s",
+                    elapsed, query_origin(), sql[:500])
+
+
+def query_origin():
+    """
+    Return the innermost stack frame that belongs to project code.
+    """
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (filename.startswith(PROJECT_ROOT)
+                and filename != THIS_FILE
+                and 'site-packages' not in filename):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request._profile = profile
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(profile))
+            response = self.get_response(request)
+
+        profile.total_ms = (time.perf_counter() - started) * 1000
+        if profile.view_started is not None and not profile.view_ms:
+            profile.view_ms = profile.total_ms
+        if not response.streaming:
+            profile.response_bytes = len(response.content)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_ms:.2f};desc="{profile.queries} queries"',
+            f'app;dur={max(profile.view_ms - profile.db_ms, 0):.2f}',
+            f'render;dur={profile.render_ms:.2f}',
+            f'total;dur={profile.total_ms:.2f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            name = f"{request.method} {match.view_name or match.route}"
+            with _stats_lock:
+                _stats.setdefault(name, ViewStats()).add(profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        profile = request._profile
+        now = time.perf_counter()
+        if profile.view_started is not None:
+            profile.view_ms = (now - profile.view_started) * 1000
+        profile.render_started = now
+
+        def rendered(response):
+            profile.render_ms = (
+                time.perf_counter() - profile.render_started) * 1000
+        response.add_post_render_callback(rendered)
+        return response
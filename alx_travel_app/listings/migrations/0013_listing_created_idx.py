@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_alter_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-created_at', '-listing_id'], name='listing_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:12
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_payment_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('event_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tx_ref', models.UUIDField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], max_length=10)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'received_at'], name='payment_event_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tx_ref', 'status'), name='unique_payment_event')],
+            },
+        ),
+    ]
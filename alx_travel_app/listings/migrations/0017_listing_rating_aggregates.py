@@ -0,0 +1,76 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_ratings(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    histograms = {}
+    rows = (Review.objects.order_by()
+            .values_list('listing_id', 'rating')
+            .annotate(count=Count('pk')))
+    for listing_id, rating, count in rows:
+        histograms.setdefault(listing_id, [0] * 5)[rating - 1] = count
+    for listing_id, histogram in histograms.items():
+        review_count = sum(histogram)
+        weighted = sum(
+            stars * count for stars, count in enumerate(histogram, start=1))
+        Listing.objects.filter(pk=listing_id).update(
+            review_count=review_count,
+            avg_rating=round(weighted / review_count, 2),
+            **{f'rating_{stars}': count
+               for stars, count in enumerate(histogram, start=1)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_paymentevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='listings.listing'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0018_review_listing_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['-created_at', '-review_id'], name='review_created_idx'),
+        ),
+    ]
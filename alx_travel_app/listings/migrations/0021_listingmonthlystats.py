@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:22
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def backfill_host_stats(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    Payment = apps.get_model('listings', 'Payment')
+    ListingMonthlyStats = apps.get_model('listings', 'ListingMonthlyStats')
+    # {(listing_id, month): {field: total}}, as the stats stood at this point
+    totals = {}
+
+    def add(listing_id, month, field, amount):
+        fields = totals.setdefault((listing_id, month), {})
+        fields[field] = fields.get(field, 0) + amount
+
+    bookings = (Booking.objects.order_by()
+                .values_list('listing_id', 'start_date', 'end_date', 'status')
+                .iterator(chunk_size=5000))
+    for listing_id, start_date, end_date, status in bookings:
+        # Counted in the first month, nights split across the months
+        if status == 'cancelled':
+            add(listing_id, month_start(start_date), 'cancelled_count', 1)
+            continue
+        add(listing_id, month_start(start_date), 'booking_count', 1)
+        day = start_date
+        while day < end_date:
+            boundary = min(next_month(day), end_date)
+            add(listing_id, month_start(day), 'booked_nights',
+                (boundary - day).days)
+            day = boundary
+
+    payments = (Payment.objects.order_by()
+                .filter(status='success')
+                .values_list('booking__listing_id',
+                             'booking__start_date', 'amount')
+                .iterator(chunk_size=5000))
+    for listing_id, start_date, amount in payments:
+        add(listing_id, month_start(start_date), 'revenue', amount)
+
+    ListingMonthlyStats.objects.bulk_create(
+        (ListingMonthlyStats(listing_id=listing_id, month=month, **fields)
+         for (listing_id, month), fields in totals.items()),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0020_user_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('booked_nights', models.IntegerField(default=0)),
+                ('booking_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'month'), name='unique_listing_month')],
+            },
+        ),
+        migrations.RunPython(backfill_host_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:27
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0021_listingmonthlystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='cleaning_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='weekend_price_per_night',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='SeasonalRate',
+            fields=[
+                ('seasonal_rate_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('price_per_night', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('weekend_price_per_night', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seasonal_rates', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', 'start_date'], name='seasonal_rate_listing_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StayDiscount',
+            fields=[
+                ('stay_discount_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('min_nights', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('percent', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stay_discounts', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'min_nights'), name='unique_listing_min_nights')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:30
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_calendar(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    bookings = (Booking.objects.order_by()
+                .exclude(status='cancelled')
+                .values_list('pk', 'listing_id', 'start_date', 'end_date')
+                .iterator(chunk_size=5000))
+    nights = []
+    for booking_id, listing_id, start_date, end_date in bookings:
+        for offset in range((end_date - start_date).days):
+            nights.append(BookedNight(
+                listing_id=listing_id, booking_id=booking_id,
+                night=start_date + timedelta(days=offset)))
+        if len(nights) >= 5000:
+            # Overlapping legacy bookings keep the first night stored
+            BookedNight.objects.bulk_create(nights, ignore_conflicts=True)
+            nights = []
+    BookedNight.objects.bulk_create(nights, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0022_listing_pricing_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='listings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'night'), name='unique_listing_night')],
+            },
+        ),
+        migrations.RunPython(backfill_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:32
+
+from django.db import migrations
+
+
+INDEXES = {
+    'mysql': (
+        "CREATE FULLTEXT INDEX listing_fulltext_idx "
+        "ON listings_listing (name, description, location)",
+        "DROP INDEX listing_fulltext_idx ON listings_listing",
+    ),
+    # The expression must match POSTGRES_VECTOR in listings/search.py
+    'postgresql': (
+        "CREATE INDEX listing_fulltext_idx ON listings_listing USING gin "
+        "((to_tsvector('english', coalesce(listings_listing.name, '') || ' ' || "
+        "coalesce(listings_listing.description, '') || ' ' || "
+        "coalesce(listings_listing.location, ''))))",
+        "DROP INDEX listing_fulltext_idx",
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    # Other backends use the in-process index in listings/search.py
+    sql = INDEXES.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql[0])
+
+
+def drop_index(apps, schema_editor):
+    sql = INDEXES.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0023_bookednight'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,7 +1,12 @@
 import uuid
-from django.db import models
+from datetime import timedelta
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MaxValueValidator, MinValueValidator
+from .geo import geocell
+from .pricing import RateCard
 
 
 class UserRole(models.TextChoices):
@@ -18,6 +23,39 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     role = models.CharField(max_length=20, choices=UserRole.choices)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Embedded in issued JWTs; bump it to revoke them all
+    token_version = models.PositiveIntegerField(default=0)
+
+    # Trusted from token claims or the cached token state, so changing
+    # any of them revokes the tokens issued before
+    TOKEN_STATE_FIELDS = ('role', 'is_staff', 'is_active')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        watched = [
+            field for field in self.TOKEN_STATE_FIELDS
+            if update_fields is None or field in update_fields]
+        revoke = False
+        if watched and not self._state.adding:
+            previous = User.objects.filter(pk=self.pk).values_list(
+                *watched).first()
+            revoke = previous is not None and previous != tuple(
+                getattr(self, field) for field in watched)
+        if revoke:
+            self.token_version = F('token_version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        if revoke:
+            self.refresh_from_db(fields=['token_version'])
+
+    def revoke_tokens(self):
+        """
+        Invalidate every token issued to this user so far.
+        """
+        self.token_version = F('token_version') + 1
+        self.save(update_fields=['token_version'])
+        self.refresh_from_db(fields=['token_version'])
 
 
 class Listing(models.Model):
@@ -32,13 +70,176 @@ class Listing(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     location = models.CharField(max_length=100)
+    latitude = models.DecimalField(
+        max_digits=9, decimal_places=6, null=True, blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.DecimalField(
+        max_digits=9, decimal_places=6, null=True, blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Derived from the coordinates for proximity search (see geo.py)
+    geocell = models.BigIntegerField(null=True, blank=True, editable=False)
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
+    # Friday and Saturday nights; defaults to price_per_night
+    weekend_price_per_night = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True)
+    cleaning_fee = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized review aggregates, kept in step by Review writes
+    avg_rating = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    RATING_FIELDS = ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-listing_id'],
+                name='listing_created_idx'),
+            models.Index(
+                fields=['location', 'price_per_night'],
+                name='listing_location_price_idx'),
+            models.Index(fields=['geocell'], name='listing_geocell_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} - ${self.price} ({self.location})"
 
+    def save(self, *args, **kwargs):
+        self.set_geocell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geocell'}
+        super().save(*args, **kwargs)
+
+    def set_geocell(self):
+        """
+        Derive the geocell from the coordinates. bulk_create and
+        bulk_update skip save(), so callers must do it themselves.
+        """
+        self.geocell = geocell(self.latitude, self.longitude)
+
+    @property
+    def rating_histogram(self):
+        return {
+            str(rating): getattr(self, field)
+            for rating, field in enumerate(self.RATING_FIELDS, start=1)}
+
+    @classmethod
+    def adjust_rating(cls, listing_id, rating, delta):
+        """
+        Add (delta=1) or remove (delta=-1) one rating from a listing's
+        aggregates with atomic column updates.
+        """
+        field = cls.RATING_FIELDS[rating - 1]
+        listings = cls.objects.filter(pk=listing_id)
+        listings.update(**{
+            field: F(field) + delta,
+            'review_count': F('review_count') + delta,
+        })
+        weighted = sum(
+            F(column) * stars
+            for stars, column in enumerate(cls.RATING_FIELDS, start=1))
+        listings.update(avg_rating=Case(
+            When(review_count=0, then=0),
+            default=Round(
+                Cast(weighted, models.FloatField()) / F('review_count'), 2),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        ))
+
+    @classmethod
+    def rate_cards(cls, listing_ids, start_date=None, end_date=None):
+        """
+        Load the pricing rules of many listings with three queries and
+        return {listing_id: RateCard}. With dates, only the seasons that
+        overlap [start_date, end_date) are loaded.
+        """
+        listing_ids = set(listing_ids)
+        seasons = SeasonalRate.objects.filter(listing_id__in=listing_ids)
+        if start_date and end_date:
+            seasons = seasons.filter(
+                start_date__lt=end_date, end_date__gt=start_date)
+        by_listing = {}
+        for listing_id, *season in seasons.values_list(
+                'listing_id', 'start_date', 'end_date',
+                'price_per_night', 'weekend_price_per_night'):
+            by_listing.setdefault(listing_id, ([], []))[0].append(tuple(season))
+        for listing_id, *discount in StayDiscount.objects.filter(
+                listing_id__in=listing_ids).values_list(
+                'listing_id', 'min_nights', 'percent'):
+            by_listing.setdefault(listing_id, ([], []))[1].append(tuple(discount))
+
+        return {
+            listing_id: RateCard(
+                price, weekend_price, cleaning_fee,
+                *by_listing.get(listing_id, ((), ())))
+            for listing_id, price, weekend_price, cleaning_fee
+            in cls.objects.filter(pk__in=listing_ids).values_list(
+                'pk', 'price_per_night', 'weekend_price_per_night',
+                'cleaning_fee')
+        }
+
+
+class SeasonalRate(models.Model):
+    """
+    Nightly rates that replace the listing's between start_date and
+    end_date (exclusive). The seasons of a listing must not overlap.
+    """
+    seasonal_rate_id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False)
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="seasonal_rates")
+    start_date = models.DateField()
+    end_date = models.DateField()
+    price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
+    weekend_price_per_night = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['listing', 'start_date'],
+                name='seasonal_rate_listing_idx'),
+        ]
+
+
+class StayDiscount(models.Model):
+    """
+    Percentage off the nightly total of stays of at least min_nights.
+    """
+    stay_discount_id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False)
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="stay_discounts")
+    min_nights = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)])
+    percent = models.DecimalField(
+        max_digits=5, decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['listing', 'min_nights'],
+                name='unique_listing_min_nights'),
+        ]
+
 
 class BookingStatus(models.TextChoices):
     PENDING = 'pending'
@@ -46,6 +247,17 @@ class BookingStatus(models.TextChoices):
     CANCELLED = 'cancelled'
 
 
+class BookingQuerySet(models.QuerySet):
+    def overlapping(self, start_date, end_date):
+        """
+        Return active (non-cancelled) bookings that overlap the
+        half-open stay [start_date, end_date).
+        """
+        return self.exclude(status=BookingStatus.CANCELLED).filter(
+            start_date__lt=end_date,
+            end_date__gt=start_date)
+
+
 class Booking(models.Model):
     booking_id = models.UUIDField(
         primary_key=True,
@@ -68,16 +280,97 @@ class Booking(models.Model):
         default=BookingStatus.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['listing', 'status', 'start_date', 'end_date'],
+                name='booking_listing_dates_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.start_date and self.end_date and self.listing:
-            days = (self.end_date - self.start_date).days
-            self.total_price = self.listing.price_per_night * days
-        return super().save(*args, **kwargs)
+        """
+        Price the stay, save it and update the host rollups and the
+        availability calendar in the same transaction. Deletes are handled
+        by a post_delete signal and the calendar's cascade.
+        """
+        if self.start_date and self.end_date and self.listing_id:
+            card, = Listing.rate_cards(
+                [self.listing_id], self.start_date, self.end_date).values()
+            self.total_price = card.quote(
+                self.start_date, self.end_date)['total']
+        with transaction.atomic():
+            deltas = {}
+            adding = self._state.adding
+            if not adding:
+                previous = Booking.objects.filter(pk=self.pk).values_list(
+                    'listing_id', 'start_date', 'end_date', 'status').first()
+                if previous:
+                    deltas = booking_rollup(*previous, sign=-1)
+            result = super().save(*args, **kwargs)
+            current = booking_rollup(
+                self.listing_id, self.start_date, self.end_date, self.status)
+            ListingMonthlyStats.apply(merge_rollups(deltas, current))
+            if not adding:
+                self.nights.all().delete()
+            BookedNight.reserve([self])
+        return result
 
     def __str__(self):
         return f"{self.booking_id} - ${self.total_price} ({self.status})"
 
 
+class BookedNightQuerySet(models.QuerySet):
+    def between(self, start_date, end_date):
+        """
+        Return the nights of the half-open stay [start_date, end_date).
+        """
+        return self.filter(night__gte=start_date, night__lt=end_date)
+
+
+class BookedNight(models.Model):
+    """
+    One row per night taken by an active (non-cancelled) booking.
+
+    The unique (listing, night) constraint makes availability checks
+    indexed lookups and rejects double bookings in the database itself.
+    """
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="calendar")
+    night = models.DateField()
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name="nights")
+
+    objects = BookedNightQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['listing', 'night'],
+                name='unique_listing_night'),
+        ]
+
+    @classmethod
+    def reserve(cls, bookings, ignore_conflicts=False):
+        """
+        Insert the nights of the given bookings, skipping cancelled ones.
+        """
+        nights = [
+            cls(listing_id=booking.listing_id,
+                night=booking.start_date + timedelta(days=offset),
+                booking_id=booking.pk)
+            for booking in bookings
+            if booking.status != BookingStatus.CANCELLED
+            for offset in range((booking.end_date - booking.start_date).days)]
+        cls.objects.bulk_create(
+            nights, batch_size=1000, ignore_conflicts=ignore_conflicts)
+
+
 class Review(models.Model):
     review_id = models.UUIDField(
         primary_key=True,
@@ -86,7 +379,7 @@ class Review(models.Model):
     listing = models.ForeignKey(
         Listing,
         on_delete=models.CASCADE,
-        related_name="listings")
+        related_name="reviews")
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -98,6 +391,33 @@ class Review(models.Model):
     comment = models.TextField(max_length=250)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['listing', '-created_at', '-review_id'],
+                name='review_listing_created_idx'),
+            models.Index(
+                fields=['-created_at', '-review_id'],
+                name='review_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the review and update the listing rating aggregates in the
+        same transaction. Deletes are handled by a post_delete signal.
+        """
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Review.objects.filter(pk=self.pk).values_list(
+                    'listing_id', 'rating').first()
+            result = super().save(*args, **kwargs)
+            if previous != (self.listing_id, self.rating):
+                if previous:
+                    Listing.adjust_rating(previous[0], previous[1], -1)
+                Listing.adjust_rating(self.listing_id, self.rating, 1)
+        return result
+
 
 class Payment(models.Model):
     class PaymentStatus(models.TextChoices):
@@ -119,3 +439,151 @@ class Payment(models.Model):
         choices=PaymentStatus.choices,
         default=PaymentStatus.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'created_at'],
+                name='payment_status_created_idx'),
+        ]
+
+
+class PaymentEvent(models.Model):
+    """
+    A status transition reported by a Chapa webhook, applied in batches.
+    """
+    event_id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False)
+    tx_ref = models.UUIDField()
+    status = models.CharField(
+        max_length=10,
+        choices=Payment.PaymentStatus.choices)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tx_ref', 'status'],
+                name='unique_payment_event'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['processed_at', 'received_at'],
+                name='payment_event_pending_idx'),
+        ]
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def booking_rollup(listing_id, start_date, end_date, status, sign=1):
+    """
+    Return a booking's contribution to the monthly host stats as
+    {(listing_id, month): {field: delta}}. Nights are split across the
+    months they fall in; the booking itself counts in its first month.
+    """
+    first = month_start(start_date)
+    if status == BookingStatus.CANCELLED:
+        return {(listing_id, first): {'cancelled_count': sign}}
+
+    rollup = {(listing_id, first): {'booking_count': sign}}
+    day = start_date
+    while day < end_date:
+        month = month_start(day)
+        boundary = min(next_month(day), end_date)
+        nights = rollup.setdefault((listing_id, month), {})
+        nights['booked_nights'] = (
+            nights.get('booked_nights', 0) + sign * (boundary - day).days)
+        day = boundary
+    return rollup
+
+
+def host_stats_totals(bookings, payments):
+    """
+    Sum the monthly host stats from scratch, given iterables of booking
+    (listing_id, start_date, end_date, status) rows and successful
+    payment (listing_id, booking start_date, amount) rows.
+    """
+    totals = {}
+    for row in bookings:
+        for key, fields in booking_rollup(*row).items():
+            target = totals.setdefault(key, {})
+            for field, delta in fields.items():
+                target[field] = target.get(field, 0) + delta
+    for listing_id, start_date, amount in payments:
+        fields = totals.setdefault((listing_id, month_start(start_date)), {})
+        fields['revenue'] = fields.get('revenue', 0) + amount
+    return totals
+
+
+def merge_rollups(*rollups):
+    merged = {}
+    for rollup in rollups:
+        for key, fields in rollup.items():
+            target = merged.setdefault(key, {})
+            for field, delta in fields.items():
+                target[field] = target.get(field, 0) + delta
+    return merged
+
+
+class ListingMonthlyStats(models.Model):
+    """
+    Per-listing, per-month booking and revenue rollup for host dashboards.
+    """
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="monthly_stats")
+    month = models.DateField()
+    booked_nights = models.IntegerField(default=0)
+    booking_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['listing', 'month'],
+                name='unique_listing_month'),
+        ]
+
+    @property
+    def occupancy_rate(self):
+        days = (next_month(self.month) - self.month).days
+        return round(self.booked_nights / days, 4)
+
+    @classmethod
+    def apply(cls, rollup):
+        """
+        Add {(listing_id, month): {field: delta}} to the stored rows,
+        creating missing rows.
+        """
+        for (listing_id, month), fields in rollup.items():
+            fields = {f: d for f, d in fields.items() if d}
+            if not fields:
+                continue
+            increments = {f: F(f) + d for f, d in fields.items()}
+            rows = cls.objects.filter(listing_id=listing_id, month=month)
+            if rows.update(**increments):
+                continue
+            # Nothing was counted for a missing row, e.g. during a
+            # cascading delete, so there is nothing to subtract from
+            added = {f: d for f, d in fields.items() if d > 0}
+            if not added:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        listing_id=listing_id, month=month, **added)
+            except IntegrityError:
+                # Created concurrently; increment that row instead
+                rows.update(**increments)
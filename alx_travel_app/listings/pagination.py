@@ -0,0 +1,37 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ListingCursorPagination(CursorPagination):
+    """
+    Keyset pagination for listings, newest first.
+
+    Pages are addressed by an opaque cursor on (created_at, listing_id)
+    so deep pages cost the same as the first one.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-listing_id')
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Keyset pagination for reviews on (created_at, review_id), newest first.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-review_id')
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Numbered pages for search results ranked by relevance or distance,
+    whose order has no stable key to build a cursor on.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -1,5 +1,4 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import Listing, Booking
 
 
 class IsGuestForBooking(BasePermission):
@@ -21,7 +20,7 @@ class IsGuestForBooking(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Allow only owners to retrieve/delete booking
-        return obj.user_id == request.user
+        return obj.user_id == request.user.pk
 
 
 class IsHostForListing(BasePermission):
@@ -31,8 +30,8 @@ class IsHostForListing(BasePermission):
     has_permission: Allow only users with role='host' to
     create a listing.
 
-    has_object_permission: Allow only owners of a listing to
-    retrieve/update/delete.
+    has_object_permission: Allow anyone to retrieve a listing and
+    only its owner to update/delete.
     """
 
     def has_permission(self, request, view):
@@ -42,5 +41,41 @@ class IsHostForListing(BasePermission):
         return True
 
     def has_object_permission(self, request, view, obj):
-        # Allow only owners to retrieve/delete booking
-        return obj.host == request.user
+        # Listings are public; only owners may modify them
+        if request.method in SAFE_METHODS:
+            return True
+        return obj.host_id == request.user.pk
+
+
+class IsReviewOwner(BasePermission):
+    """
+    This class defines permissions for the reviews view
+
+    has_object_permission: Allow anyone to retrieve a review and
+    only its author to update/delete.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        return obj.user_id == request.user.pk
+
+
+class IsAdminRole(BasePermission):
+    """
+    Allow only users with role='admin' (or Django staff).
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (
+            user.role == 'admin' or user.is_staff)
+
+
+class IsHost(BasePermission):
+    """
+    Allow only users with role='host'.
+    """
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == 'host'
@@ -0,0 +1,106 @@
+"""
+Stay pricing.
+
+A listing's rate card holds its base and weekend nightly rates, seasonal
+overrides, length-of-stay discounts and a cleaning fee. A stay is priced
+by counting the weekday and weekend nights that fall in each season with
+date arithmetic instead of walking night by night, so a quote costs
+O(seasons) however long the stay is. Rate cards for a whole page of
+listings are loaded with a fixed number of queries
+(`Listing.rate_cards`), which lets search results be quoted in bulk.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+
+CENTS = Decimal('0.01')
+# Friday and Saturday nights
+WEEKEND_NIGHTS = frozenset((4, 5))
+
+
+def weekend_nights(start_date, end_date):
+    """
+    Count the Friday and Saturday nights of the stay [start_date, end_date).
+    """
+    nights = (end_date - start_date).days
+    weeks, rest = divmod(nights, 7)
+    first = start_date.weekday()
+    return weeks * len(WEEKEND_NIGHTS) + sum(
+        1 for offset in range(rest) if (first + offset) % 7 in WEEKEND_NIGHTS)
+
+
+class RateCard:
+    """
+    Pricing rules of one listing.
+
+    `seasons` are (start_date, end_date, price_per_night,
+    weekend_price_per_night) tuples with an exclusive end_date and must
+    not overlap. `discounts` are (min_nights, percent) pairs; the one
+    with the highest min_nights the stay reaches applies.
+    """
+
+    def __init__(self, price_per_night, weekend_price_per_night=None,
+                 cleaning_fee=0, seasons=(), discounts=()):
+        self.price_per_night = Decimal(price_per_night)
+        self.weekend_price_per_night = (
+            self.price_per_night if weekend_price_per_night is None
+            else Decimal(weekend_price_per_night))
+        self.cleaning_fee = Decimal(cleaning_fee)
+        self.seasons = sorted(seasons)
+        self.discounts = sorted(discounts, reverse=True)
+
+    def night_price(self, night):
+        """
+        Return the rate of a single night, before discounts and fees.
+        """
+        weekend = night.weekday() in WEEKEND_NIGHTS
+        for start, end, price, weekend_price in self.seasons:
+            if start <= night < end:
+                if weekend and weekend_price is not None:
+                    return weekend_price
+                return price
+        return self.weekend_price_per_night if weekend else self.price_per_night
+
+    def quote(self, start_date, end_date):
+        """
+        Price the stay [start_date, end_date).
+        """
+        nights = (end_date - start_date).days
+        weekend = weekend_nights(start_date, end_date)
+        base_nights, base_weekend = nights, weekend
+
+        nightly_total = Decimal(0)
+        for season_start, season_end, price, weekend_price in self.seasons:
+            if season_start >= end_date:
+                break
+            start = max(start_date, season_start)
+            end = min(end_date, season_end)
+            if start >= end:
+                continue
+            season_nights = (end - start).days
+            season_weekend = weekend_nights(start, end)
+            if weekend_price is None:
+                weekend_price = price
+            nightly_total += ((season_nights - season_weekend) * price
+                              + season_weekend * weekend_price)
+            base_nights -= season_nights
+            base_weekend -= season_weekend
+
+        nightly_total += ((base_nights - base_weekend) * self.price_per_night
+                          + base_weekend * self.weekend_price_per_night)
+
+        percent = next(
+            (percent for min_nights, percent in self.discounts
+             if nights >= min_nights), Decimal(0))
+        discount = (nightly_total * Decimal(percent) / 100).quantize(
+            CENTS, rounding=ROUND_HALF_UP)
+        nightly_total = nightly_total.quantize(CENTS)
+        return {
+            'check_in': start_date,
+            'check_out': end_date,
+            'nights': nights,
+            'weekend_nights': weekend,
+            'nightly_total': nightly_total,
+            'discount': discount,
+            'cleaning_fee': self.cleaning_fee,
+            'total': nightly_total - discount + self.cleaning_fee,
+        }
@@ -0,0 +1,84 @@
+"""
+JSON rendering and parsing with orjson.
+
+orjson encodes str, int, float, dict, list, datetime, date, time and
+UUID in C and writes the same bytes as DRF's JSONRenderer for them.
+Other types, such as Decimal, timedelta and lazy translations, are
+handed to DRF's own encoder, so they are converted exactly as before.
+Whatever orjson cannot produce identically is rendered or parsed by the
+stdlib path of the DRF base classes. That covers a missing orjson,
+indented or ASCII-only output, integers wider than 64 bits and
+malformed bodies, whose parse errors keep their usual wording.
+
+Two differences remain:
+- Floats of magnitude 1e16 or more, or below 1e-4, spell their exponent
+  without a sign or leading zero (`1e16`, not `1e+16`), with the same value.
+- NaN and infinities render as null instead of failing the response.
+"""
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+# orjson reads integers beyond 64 bits as floats, so bodies with a run
+# of 19 digits are left to json. Digits are mapped to 0 and everything
+# else to a space, which turns the check into one substring search.
+DIGITS_TO_ZEROS = bytes(
+    ord('0') if b in b'0123456789' else ord(' ') for b in range(256))
+LONG_DIGIT_RUN = b'0' * 19
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer serializing compact UTF-8 output with orjson.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (orjson is None or indent is not None or self.ensure_ascii
+                or not self.compact or not self.strict):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer as they end lines in JavaScript
+        if LINE_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+        if PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """
+    Drop-in JSONParser decoding UTF-8 bodies with orjson.
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_DIGIT_RUN not in body.translate(DIGITS_TO_ZEROS):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,160 @@
+"""
+Full-text search over listing name, description and location.
+
+MySQL uses the `listing_fulltext_idx` FULLTEXT index and PostgreSQL a
+GIN index on the matching `to_tsvector` expression; both are maintained
+by the database on every write. Other backends (SQLite in development
+and tests) fall back to an inverted index held in process memory. It is
+built on first use and kept current by the Listing signals and
+`index_listings`, so it only sees writes made by the same process.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from .models import Listing
+
+
+TABLE = Listing._meta.db_table
+MYSQL_MATCH = (
+    f"MATCH ({TABLE}.name, {TABLE}.description, {TABLE}.location) "
+    f"AGAINST (%s IN NATURAL LANGUAGE MODE)")
+# Must stay identical to the indexed expression in the migration
+POSTGRES_VECTOR = (
+    f"to_tsvector('english', coalesce({TABLE}.name, '') || ' ' || "
+    f"coalesce({TABLE}.description, '') || ' ' || "
+    f"coalesce({TABLE}.location, ''))")
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-memory BM25 index of listing text, used when the database has no
+    full-text search.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings = {}
+        self._terms = {}
+        self._lengths = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _add(self, listing_id, text):
+        terms = Counter(tokenize(text))
+        self._terms[listing_id] = list(terms)
+        self._lengths[listing_id] = sum(terms.values())
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[listing_id] = count
+
+    def _remove(self, listing_id):
+        self._lengths.pop(listing_id, None)
+        for term in self._terms.pop(listing_id, ()):
+            postings = self._postings[term]
+            del postings[listing_id]
+            if not postings:
+                del self._postings[term]
+
+    def _load(self):
+        rows = Listing.objects.order_by().values_list(
+            'pk', 'name', 'description', 'location').iterator(chunk_size=5000)
+        for listing_id, *fields in rows:
+            self._add(listing_id, ' '.join(fields))
+        self._loaded = True
+
+    def update(self, listings):
+        """
+        Re-index the given listings if the index has been built.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            for listing in listings:
+                self._remove(listing.pk)
+                self._add(listing.pk, ' '.join(
+                    [listing.name, listing.description, listing.location]))
+
+    def remove(self, listing_id):
+        with self._lock:
+            self._remove(listing_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings, self._terms, self._lengths = {}, {}, {}
+            self._loaded = False
+
+    def search(self, query, limit):
+        """
+        Return up to `limit` (listing_id, score) pairs, best first.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            documents = len(self._lengths)
+            if not documents:
+                return []
+            average = sum(self._lengths.values()) / documents
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term, {})
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for listing_id, count in postings.items():
+                    norm = self.K1 * (
+                        1 - self.B + self.B * self._lengths[listing_id] / average)
+                    scores[listing_id] = scores.get(listing_id, 0) + (
+                        idf * count * (self.K1 + 1) / (count + norm))
+        return sorted(scores.items(), key=lambda hit: -hit[1])[:limit]
+
+
+fallback_index = InvertedIndex()
+
+
+def index_listings(listings):
+    """
+    Index listings written without signals, e.g. by bulk_create.
+    """
+    fallback_index.update(listings)
+
+
+def full_text_search(queryset, query):
+    """
+    Filter a listing queryset to `query` matches, annotated with a
+    `rank` and ordered best first.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        queryset = queryset.annotate(
+            rank=RawSQL(MYSQL_MATCH, [query], output_field=FloatField())
+        ).filter(rank__gt=0)
+    elif vendor == 'postgresql':
+        tsquery = "plainto_tsquery('english', %s)"
+        queryset = queryset.filter(RawSQL(
+            f"{POSTGRES_VECTOR} @@ {tsquery}", [query],
+            output_field=BooleanField())).annotate(rank=RawSQL(
+                f"ts_rank({POSTGRES_VECTOR}, {tsquery})", [query],
+                output_field=FloatField()))
+    else:
+        hits = fallback_index.search(query, settings.SEARCH_FALLBACK_LIMIT)
+        if not hits:
+            return queryset.none()
+        queryset = queryset.filter(pk__in=[pk for pk, _ in hits]).annotate(
+            rank=Case(
+                *[When(pk=pk, then=Value(score)) for pk, score in hits],
+                output_field=FloatField()))
+    return queryset.order_by('-rank', '-created_at', '-listing_id')
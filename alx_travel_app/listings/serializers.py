@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Listing, Booking, User, Review, Payment
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .fieldsets import SparseFieldsMixin
+from .models import Listing, BookedNight, Booking, BookingStatus, ListingMonthlyStats, SeasonalRate, StayDiscount, User, Review, Payment
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -17,7 +21,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['user_id', 'created_at', 'role']
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     listing = serializers.PrimaryKeyRelatedField(
         queryset=Listing.objects.all())
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -36,10 +40,104 @@ class BookingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['booking_id', 'total_price', 'created_at']
 
+    def validate(self, attrs):
+        start_date = attrs.get(
+            'start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get(
+            'end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date <= start_date:
+            raise serializers.ValidationError(
+                "end_date must be after start_date")
+        return attrs
 
-class ListingSerializer(serializers.ModelSerializer):
+    def check_availability(self, validated_data):
+        """
+        Lock the listing row and reject the booking if any of its nights
+        is already taken in the calendar. Must be called inside a transaction so the lock
+        is held until the booking is written.
+        """
+        def current(field, default=None):
+            return validated_data.get(
+                field, getattr(self.instance, field, default))
+
+        if current('status', BookingStatus.PENDING) == BookingStatus.CANCELLED:
+            return
+        listing = current('listing')
+
+        # Serialize concurrent bookings of the same listing
+        Listing.objects.select_for_update().only('pk').get(pk=listing.pk)
+
+        taken = BookedNight.objects.filter(listing=listing).between(
+            current('start_date'), current('end_date'))
+        if self.instance is not None:
+            taken = taken.exclude(booking=self.instance)
+        if taken.exists():
+            raise self.unavailable()
+
+    def unavailable(self):
+        return serializers.ValidationError(
+            {"non_field_errors": ["listing is not available for these dates"]})
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                self.check_availability(validated_data)
+                return super().create(validated_data)
+        except IntegrityError:
+            # A night was taken despite the check, e.g. by a write that
+            # bypassed the listing lock; unique_listing_night refused it
+            raise self.unavailable()
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                self.check_availability(validated_data)
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise self.unavailable()
+
+
+class BulkBookingItemSerializer(serializers.Serializer):
+    """
+    One booking of a bulk request. The listing is a plain UUID so the
+    whole batch can be resolved with a single query.
+    """
+    listing = serializers.UUIDField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    status = serializers.ChoiceField(
+        choices=BookingStatus.choices, default=BookingStatus.PENDING)
+
+    def validate(self, attrs):
+        if attrs['end_date'] <= attrs['start_date']:
+            raise serializers.ValidationError(
+                "end_date must be after start_date")
+        return attrs
+
+
+def validate_items(serializer_class, items):
+    """
+    Validate each item of a bulk request on its own.
+
+    Return ({index: validated_data}, {index: errors}).
+    """
+    valid, errors = {}, {}
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+class ListingSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact listing representation used by the list route.
+    """
     host = serializers.PrimaryKeyRelatedField(read_only=True)
-    bookings = BookingSerializer(many=True, read_only=True)
+    rating_histogram = serializers.DictField(
+        child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Listing
@@ -49,21 +147,253 @@ class ListingSerializer(serializers.ModelSerializer):
             'name',
             'description',
             'location',
+            'latitude',
+            'longitude',
             'price_per_night',
+            'avg_rating',
+            'review_count',
+            'rating_histogram',
             'created_at',
             'updated_at',
-            'bookings',
         ]
-        read_only_fields = ['listing_id', 'created_at', 'updated_at']
+        read_only_fields = [
+            'listing_id',
+            'avg_rating',
+            'review_count',
+            'created_at',
+            'updated_at',
+        ]
+        # Columns read by properties, for sparse fieldset projections
+        source_columns = {'rating_histogram': Listing.RATING_FIELDS}
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError(
+                "latitude and longitude must be provided together")
+        return attrs
 
 
-class ReviewSerializer(serializers.Serializer):
+class ListingSerializer(ListingSummarySerializer):
+    """
+    Full listing representation with its nested bookings.
+    """
+    bookings = BookingSerializer(many=True, read_only=True)
+
+    class Meta(ListingSummarySerializer.Meta):
+        fields = ListingSummarySerializer.Meta.fields + ['bookings']
+
+
+class ListingSearchSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the availability search.
+    """
+    q = serializers.CharField(required=False, max_length=200)
+    location = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False)
+    check_in = serializers.DateField(required=False)
+    check_out = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        check_in = attrs.get('check_in')
+        check_out = attrs.get('check_out')
+        if bool(check_in) != bool(check_out):
+            raise serializers.ValidationError(
+                "check_in and check_out must be provided together")
+        if check_in and check_out <= check_in:
+            raise serializers.ValidationError(
+                "check_out must be after check_in")
+        return attrs
+
+
+class NearbySearchSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the proximity search. The radius
+    is in kilometres.
+    """
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0, default=10)
+
+    def validate_radius(self, value):
+        if value > settings.NEARBY_MAX_RADIUS_KM:
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to "
+                f"{settings.NEARBY_MAX_RADIUS_KM:g}.")
+        return value
+
+
+class QuoteQuerySerializer(serializers.Serializer):
+    """
+    Validates the stay of a price quote.
+    """
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs['check_out'] <= attrs['check_in']:
+            raise serializers.ValidationError(
+                "check_out must be after check_in")
+        return attrs
+
+
+class QuoteSerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    nights = serializers.IntegerField()
+    weekend_nights = serializers.IntegerField()
+    nightly_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    cleaning_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class ReplacedItemMixin:
+    """
+    Validate nested list items in full, even under a partial update,
+    since the submitted list replaces the stored rows.
+    """
+
+    def to_internal_value(self, data):
+        if not getattr(self.root, 'partial', False):
+            return super().to_internal_value(data)
+        item = type(self)(data=data, context=self.context)
+        item.is_valid(raise_exception=True)
+        return item.validated_data
+
+
+class SeasonalRateSerializer(ReplacedItemMixin, serializers.ModelSerializer):
+    class Meta:
+        model = SeasonalRate
+        fields = [
+            'start_date',
+            'end_date',
+            'price_per_night',
+            'weekend_price_per_night',
+        ]
+
+    def validate(self, attrs):
+        if attrs['end_date'] <= attrs['start_date']:
+            raise serializers.ValidationError(
+                "end_date must be after start_date")
+        return attrs
+
+
+class StayDiscountSerializer(ReplacedItemMixin, serializers.ModelSerializer):
+    class Meta:
+        model = StayDiscount
+        fields = ['min_nights', 'percent']
+        # Uniqueness is checked across the submitted list instead
+        validators = []
+
+
+class ListingPricingSerializer(serializers.ModelSerializer):
+    """
+    A listing's rate card. Updates replace the seasons and discounts.
+    """
+    seasonal_rates = SeasonalRateSerializer(many=True, required=False)
+    stay_discounts = StayDiscountSerializer(many=True, required=False)
+
+    class Meta:
+        model = Listing
+        fields = [
+            'listing_id',
+            'price_per_night',
+            'weekend_price_per_night',
+            'cleaning_fee',
+            'seasonal_rates',
+            'stay_discounts',
+        ]
+        read_only_fields = ['listing_id']
+
+    def validate_seasonal_rates(self, seasons):
+        seasons = sorted(seasons, key=lambda season: season['start_date'])
+        for previous, season in zip(seasons, seasons[1:]):
+            if season['start_date'] < previous['end_date']:
+                raise serializers.ValidationError("seasons must not overlap")
+        return seasons
+
+    def validate_stay_discounts(self, discounts):
+        min_nights = [discount['min_nights'] for discount in discounts]
+        if len(set(min_nights)) != len(min_nights):
+            raise serializers.ValidationError(
+                "min_nights must be unique")
+        return discounts
+
+    def update(self, instance, validated_data):
+        seasons = validated_data.pop('seasonal_rates', None)
+        discounts = validated_data.pop('stay_discounts', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if seasons is not None:
+                instance.seasonal_rates.all().delete()
+                SeasonalRate.objects.bulk_create(
+                    SeasonalRate(listing=instance, **season)
+                    for season in seasons)
+            if discounts is not None:
+                instance.stay_discounts.all().delete()
+                StayDiscount.objects.bulk_create(
+                    StayDiscount(listing=instance, **discount)
+                    for discount in discounts)
+        return instance
+
+
+class DateRangeSerializer(serializers.Serializer):
+    """
+    Validates optional `?from=&to=` date query parameters.
+    """
+
+    def get_fields(self):
+        # `from` is a keyword, so the fields cannot be declared as attributes
+        return {
+            'from': serializers.DateField(required=False),
+            'to': serializers.DateField(required=False),
+        }
+
+    def validate(self, attrs):
+        if 'from' in attrs and 'to' in attrs and attrs['to'] < attrs['from']:
+            raise serializers.ValidationError("to must not be before from")
+        return attrs
+
+
+class ListingMonthlyStatsSerializer(serializers.ModelSerializer):
+    occupancy_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ListingMonthlyStats
+        fields = [
+            'month',
+            'booked_nights',
+            'booking_count',
+            'cancelled_count',
+            'revenue',
+            'occupancy_rate',
+        ]
+        read_only_fields = fields
+
+
+class ReviewerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['user_id', 'first_name', 'last_name']
+        read_only_fields = fields
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    listing = serializers.PrimaryKeyRelatedField(
+        queryset=Listing.objects.only('pk'))
+    user = ReviewerSerializer(read_only=True)
+
     class Meta:
         model = Review
         fields = [
             'review_id',
-            'listing_id',
-            'user_id',
+            'listing',
+            'user',
             'rating',
             'comment',
             'created_at'
@@ -71,7 +401,7 @@ class ReviewSerializer(serializers.Serializer):
         read_only_fields = ['review_id', 'created_at']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     booking = serializers.PrimaryKeyRelatedField(
         queryset=Booking.objects.all())
 
@@ -86,3 +416,18 @@ class PaymentSerializer(serializers.ModelSerializer):
             'created_at',
         ]
         read_only_fields = ['payment_id', 'created_at']
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Embed the claims `ClaimsJWTAuthentication` needs to skip the user query.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        token['tv'] = user.token_version
+        return token
@@ -0,0 +1,83 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import user_state_cache
+from .cache import invalidate_listings
+from .search import fallback_index
+from .models import (
+    Booking,
+    Listing,
+    ListingMonthlyStats,
+    Payment,
+    Review,
+    SeasonalRate,
+    StayDiscount,
+    User,
+    booking_rollup,
+    month_start,
+)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    """
+    Drop a deleted review from its listing aggregates. Runs inside the
+    delete transaction, including cascades.
+    """
+    Listing.adjust_rating(instance.listing_id, instance.rating, -1)
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_rollup(sender, instance, **kwargs):
+    """
+    Drop a deleted booking from the host rollups, inside the delete
+    transaction.
+    """
+    ListingMonthlyStats.apply(booking_rollup(
+        instance.listing_id, instance.start_date, instance.end_date,
+        instance.status, sign=-1))
+
+
+@receiver(post_delete, sender=Payment)
+def remove_payment_revenue(sender, instance, **kwargs):
+    if instance.status != Payment.PaymentStatus.SUCCESS:
+        return
+    booking = Booking.objects.filter(pk=instance.booking_id).values_list(
+        'listing_id', 'start_date').first()
+    if booking:
+        ListingMonthlyStats.apply({
+            (booking[0], month_start(booking[1])): {
+                'revenue': -instance.amount}})
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_listing(sender, instance, **kwargs):
+    invalidate_listings([instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, **kwargs):
+    fallback_index.update([instance])
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    fallback_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=SeasonalRate)
+@receiver(post_delete, sender=SeasonalRate)
+@receiver(post_save, sender=StayDiscount)
+@receiver(post_delete, sender=StayDiscount)
+def invalidate_listing_children(sender, instance, **kwargs):
+    invalidate_listings([instance.listing_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_state(sender, instance, **kwargs):
+    user_state_cache.discard(instance.pk)
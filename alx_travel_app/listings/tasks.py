@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+from .chapa import get_client, transaction_status, ChapaError, ChapaUnavailable
+from .cache import invalidate_listings
+from .metrics import PAYMENT_VERIFICATIONS
+from .models import (
+    Booking,
+    BookingStatus,
+    ListingMonthlyStats,
+    Payment,
+    PaymentEvent,
+    merge_rollups,
+    month_start,
+)
+
+
+def apply_payment_statuses(statuses):
+    """
+    Bulk-apply {tx_ref: status} results, one UPDATE per status.
+
+    Only pending payments are touched so a stale result never
+    overwrites a final status. Bookings of successful payments are
+    confirmed.
+    """
+    by_status = {}
+    for tx_ref, new_status in statuses.items():
+        if new_status:
+            by_status.setdefault(new_status, []).append(tx_ref)
+
+    updated = 0
+    with transaction.atomic():
+        for new_status, tx_refs in by_status.items():
+            pending = Payment.objects.filter(
+                tx_ref__in=tx_refs, status=Payment.PaymentStatus.PENDING)
+            if new_status != Payment.PaymentStatus.SUCCESS:
+                updated += pending.update(status=new_status)
+                continue
+
+            # Lock the rows so their revenue is counted exactly once
+            paid = list(pending.select_for_update().values_list(
+                'pk', 'amount', 'booking_id',
+                'booking__listing_id', 'booking__start_date'))
+            updated += Payment.objects.filter(
+                pk__in=[row[0] for row in paid]).update(status=new_status)
+            ListingMonthlyStats.apply(merge_rollups(*(
+                {(listing_id, month_start(start_date)): {'revenue': amount}}
+                for _, amount, _, listing_id, start_date in paid)))
+
+            bookings = dict(Booking.objects.filter(
+                pk__in=[row[2] for row in paid],
+                status=BookingStatus.PENDING,
+            ).values_list('pk', 'listing_id'))
+            if bookings:
+                Booking.objects.filter(pk__in=bookings).update(
+                    status=BookingStatus.CONFIRMED)
+                invalidate_listings(bookings.values())
+    return updated
+
+
+@shared_task(
+    autoretry_for=(ChapaUnavailable,),
+    retry_backoff=True,
+    retry_jitter=True,
+    max_retries=5)
+def verify_payment_task(tx_ref):
+    """
+    Verify a single payment with Chapa and record the outcome.
+    """
+    new_status = transaction_status(get_client().verify(tx_ref))
+    PAYMENT_VERIFICATIONS.labels(new_status or 'pending').inc()
+    return apply_payment_statuses({tx_ref: new_status})
+
+
+def _verify(tx_ref):
+    try:
+        new_status = transaction_status(get_client().verify(tx_ref))
+    except ChapaError:
+        PAYMENT_VERIFICATIONS.labels('unavailable').inc()
+        return tx_ref, None
+    PAYMENT_VERIFICATIONS.labels(new_status or 'pending').inc()
+    return tx_ref, new_status
+
+
+@shared_task
+def reconcile_pending_payments(batch_size=100, concurrency=8, limit=5000):
+    """
+    Sweep pending payments, verify them with bounded concurrency and
+    bulk-update their statuses batch by batch.
+    """
+    tx_refs = list(
+        Payment.objects.filter(status=Payment.PaymentStatus.PENDING)
+        .order_by('created_at')
+        .values_list('tx_ref', flat=True)[:limit])
+
+    updated = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for start in range(0, len(tx_refs), batch_size):
+            batch = tx_refs[start:start + batch_size]
+            updated += apply_payment_statuses(
+                dict(executor.map(_verify, batch)))
+    return updated
+
+
+@shared_task
+def process_payment_events(batch_size=500):
+    """
+    Drain unprocessed webhook events, one transaction per batch.
+    """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                PaymentEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by('received_at')
+                .values_list('event_id', 'tx_ref', 'status')[:batch_size])
+            if not events:
+                return processed
+            apply_payment_statuses(
+                {tx_ref: event_status for _, tx_ref, event_status in events})
+            PaymentEvent.objects.filter(
+                event_id__in=[event_id for event_id, _, _ in events],
+            ).update(processed_at=timezone.now())
+        processed += len(events)
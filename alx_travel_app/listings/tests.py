@@ -1,3 +1,838 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from .chapa import AsyncChapaClient, ChapaClient, ChapaUnavailable, CircuitBreaker, reset_client
+from .fake_chapa import FakeChapaServer
+from .management.commands.benchmark_json import COMPATIBILITY_CASES, PARSE_CASES
+from .models import BookedNight, Booking, BookingStatus, Listing, ListingMonthlyStats, Payment, PaymentEvent, Review, User
+from .renderers import ORJSONParser, ORJSONRenderer, orjson
+from .serializers import BookingSerializer, ClaimsTokenObtainPairSerializer
+from .tasks import reconcile_pending_payments, verify_payment_task
+
+
+class ListingPricingTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.listing = Listing.objects.create(
+            host=self.host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        self.client.force_authenticate(self.host)
+        self.url = f'/api/listings/{self.listing.pk}/pricing'
+
+    def test_patch_validates_replaced_items_in_full(self):
+        for body, field, missing in (
+                ({'seasonal_rates': [{'price_per_night': '10'}]},
+                 'seasonal_rates', {'start_date', 'end_date'}),
+                ({'stay_discounts': [{'percent': '5'}]},
+                 'stay_discounts', {'min_nights'})):
+            response = self.client.patch(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(set(response.json()[field][0]), missing)
+
+    def test_patch_replaces_seasons_and_keeps_other_fields(self):
+        season = {'start_date': '2030-01-01', 'end_date': '2030-01-05',
+                  'price_per_night': '80.00', 'weekend_price_per_night': None}
+        response = self.client.patch(
+            self.url, {'seasonal_rates': [season]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['seasonal_rates'], [season])
+        self.assertEqual(response.json()['price_per_night'], '100.00')
+
+    def test_malformed_listing_id_is_not_found(self):
+        for method in (self.client.get, self.client.patch):
+            response = method('/api/listings/nope/pricing', {}, format='json')
+            self.assertEqual(response.status_code, 404)
+
+
+class HostStatsTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.listing = Listing.objects.create(
+            host=self.host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+
+    def stats(self):
+        return list(ListingMonthlyStats.objects.filter(
+            listing=self.listing).values_list(
+            'month', 'booked_nights', 'booking_count', 'cancelled_count'))
+
+    def test_bookings_update_the_monthly_rollup(self):
+        booking = Booking.objects.create(
+            listing=self.listing, user=self.host, total_price=0,
+            start_date=date(2030, 1, 30), end_date=date(2030, 2, 2))
+        self.assertEqual(sorted(self.stats()), [
+            (date(2030, 1, 1), 2, 1, 0), (date(2030, 2, 1), 1, 0, 0)])
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        self.assertEqual(sorted(self.stats()), [
+            (date(2030, 1, 1), 0, 0, 1), (date(2030, 2, 1), 0, 0, 0)])
+
+    def test_host_dashboard_reads_the_rollup(self):
+        Booking.objects.create(
+            listing=self.listing, user=self.host, total_price=0,
+            start_date=date(2030, 1, 30), end_date=date(2030, 2, 2))
+        client = APIClient()
+        client.force_authenticate(self.host)
+        with self.assertNumQueries(1):
+            response = client.get('/api/host/stats/?from=2030-01-01&to=2030-02-01')
+        self.assertEqual(response.status_code, 200)
+        listing, = response.json()['listings']
+        self.assertEqual(listing['booked_nights'], 3)
+        self.assertEqual(
+            [(m['month'], m['booked_nights'], m['occupancy_rate'])
+             for m in listing['months']],
+            [('2030-01-01', 2, round(2 / 31, 4)),
+             ('2030-02-01', 1, round(1 / 28, 4))])
+
+    def test_missing_row_never_starts_negative(self):
+        booking = Booking.objects.create(
+            listing=self.listing, user=self.host, total_price=0,
+            start_date=date(2030, 1, 1), end_date=date(2030, 1, 4))
+        ListingMonthlyStats.objects.all().delete()
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        self.assertEqual(self.stats(), [(date(2030, 1, 1), 0, 0, 1)])
+
+
+class SeedCommandTests(TestCase):
+    def seed(self):
+        call_command('seed', users=6, listings=4, bookings_per_listing=3,
+                     seed=1, stdout=io.StringIO())
+
+    def test_repeated_runs_with_one_seed_add_to_the_data(self):
+        self.seed()
+        nights = BookedNight.objects.count()
+        stats = ListingMonthlyStats.objects.count()
+        self.seed()
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(Listing.objects.count(), 8)
+        # The second run writes the rows of its own listings only
+        self.assertEqual(BookedNight.objects.count(), 2 * nights)
+        self.assertEqual(ListingMonthlyStats.objects.count(), 2 * stats)
+        self.assertEqual(BookedNight.objects.count(), sum(
+            (booking.end_date - booking.start_date).days
+            for booking in Booking.objects.exclude(
+                status=BookingStatus.CANCELLED)))
+        rows = sorted(ListingMonthlyStats.objects.values_list(
+            'listing_id', 'month', 'booked_nights', 'booking_count',
+            'cancelled_count'))
+        call_command('rebuild_host_stats', stdout=io.StringIO())
+        self.assertEqual(rows, sorted(ListingMonthlyStats.objects.values_list(
+            'listing_id', 'month', 'booked_nights', 'booking_count',
+            'cancelled_count')))
+
+
+class BookingOverlapTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.guest = User.objects.create_user(
+            username='guest', password='pass', role='guest')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        self.client.force_authenticate(self.guest)
+
+    def book(self, start_date, end_date):
+        return self.client.post('/api/bookings', {
+            'listing': str(self.listing.pk),
+            'start_date': start_date,
+            'end_date': end_date,
+        }, format='json')
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book('2030-01-01', '2030-01-05').status_code, 201)
+        response = self.book('2030-01-04', '2030-01-06')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'non_field_errors': ['listing is not available for these dates']})
+        self.assertEqual(self.book('2030-01-05', '2030-01-06').status_code, 201)
+
+    def test_calendar_constraint_is_reported_as_unavailable(self):
+        self.assertEqual(self.book('2030-01-01', '2030-01-05').status_code, 201)
+        # As if a concurrent write had slipped past the availability check
+        with mock.patch.object(BookingSerializer, 'check_availability'):
+            response = self.book('2030-01-04', '2030-01-06')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'non_field_errors': ['listing is not available for these dates']})
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class ListingSearchTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        guest = User.objects.create_user(
+            username='guest', password='pass', role='guest')
+        self.cheap, self.dear, self.elsewhere = (
+            Listing.objects.create(
+                host=host, name=name, description='d', location=location,
+                price_per_night=price)
+            for name, location, price in (
+                ('Cheap', 'Addis Ababa', 80),
+                ('Dear', 'Addis Ababa', 300),
+                ('Elsewhere', 'Bahir Dar', 80)))
+        self.booked = Listing.objects.create(
+            host=host, name='Booked', description='d',
+            location='Addis Ababa', price_per_night=90)
+        Booking.objects.create(
+            listing=self.booked, user=guest,
+            start_date=date(2030, 1, 3), end_date=date(2030, 1, 6))
+
+    def search(self, **params):
+        response = self.client.get('/api/listings/search', params)
+        self.assertEqual(response.status_code, 200)
+        return {item['name'] for item in response.json()['results']}
+
+    def test_location_and_price_filters(self):
+        self.assertEqual(
+            self.search(location='Addis Ababa', max_price='100'),
+            {'Cheap', 'Booked'})
+        self.assertEqual(
+            self.search(location='Addis Ababa', min_price='100'), {'Dear'})
+
+    def test_booked_listings_are_left_out_of_overlapping_windows(self):
+        self.assertEqual(
+            self.search(location='Addis Ababa', max_price='100',
+                        check_in='2030-01-05', check_out='2030-01-08'),
+            {'Cheap'})
+        # Stays are half-open, so the check-out night is free again
+        self.assertEqual(
+            self.search(location='Addis Ababa', max_price='100',
+                        check_in='2030-01-06', check_out='2030-01-08'),
+            {'Cheap', 'Booked'})
+        self.assertEqual(
+            self.search(location='Addis Ababa', max_price='100',
+                        check_in='2030-01-01', check_out='2030-01-03'),
+            {'Cheap', 'Booked'})
+
+    def test_cancelled_bookings_free_their_nights(self):
+        booking = Booking.objects.get(listing=self.booked)
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        self.assertIn('Booked', self.search(
+            check_in='2030-01-04', check_out='2030-01-05'))
+
+    def test_incomplete_date_window_is_rejected(self):
+        response = self.client.get(
+            '/api/listings/search', {'check_in': '2030-01-04'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/listings/search', {
+            'check_in': '2030-01-04', 'check_out': '2030-01-04'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Parallel POSTs for one listing must never leave overlapping stays.
+    SQLite has no row locks and fails concurrent writers, so this runs on
+    the production database engines only.
+    """
+    REQUESTS = 300
+    THREADS = 32
+    WINDOW_NIGHTS = 60
+
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        # One guest per request, so no guest runs into the booking throttle
+        self.guests = User.objects.bulk_create(
+            User(username=f'guest-{index}', role='guest')
+            for index in range(self.REQUESTS))
+
+    def book(self, guest, start_date, end_date):
+        client = APIClient()
+        client.force_authenticate(guest)
+        try:
+            return client.post('/api/bookings', {
+                'listing': str(self.listing.pk),
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_never_overlap(self):
+        rng = random.Random(42)
+        first = date(2030, 1, 1)
+        stays = []
+        for guest in self.guests:
+            start_date = first + timedelta(
+                days=rng.randrange(self.WINDOW_NIGHTS - 3))
+            stays.append((guest, start_date,
+                          start_date + timedelta(days=rng.randint(1, 3))))
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            codes = list(executor.map(lambda stay: self.book(*stay), stays))
+
+        self.assertEqual(set(codes), {201, 400})
+        bookings = list(Booking.objects.exclude(
+            status=BookingStatus.CANCELLED).order_by('start_date'))
+        self.assertEqual(len(bookings), codes.count(201))
+        for previous, booking in zip(bookings, bookings[1:]):
+            self.assertLessEqual(previous.end_date, booking.start_date)
+        self.assertEqual(
+            BookedNight.objects.filter(listing=self.listing).count(),
+            sum((b.end_date - b.start_date).days for b in bookings))
+
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+class FakeChapaTestCase(APITestCase):
+    """
+    Point the Chapa client at a local fake server and run Celery tasks
+    eagerly, in process.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.chapa = FakeChapaServer().start()
+        cls.addClassCleanup(cls.chapa.stop)
+
+    def setUp(self):
+        self.chapa.set_down(False)
+        self.chapa.httpd.verify_status = 'success'
+        settings_override = override_settings(
+            CHAPA_BASE_URL=self.chapa.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.guest = User.objects.create_user(
+            username='guest', password='pass', role='guest')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+
+    def pending_payment(self, start_date=date(2030, 1, 1)):
+        booking = Booking.objects.create(
+            listing=self.listing, user=self.guest, total_price=0,
+            start_date=start_date, end_date=start_date + timedelta(days=2))
+        return Payment.objects.create(
+            booking=booking, tx_ref=uuid.uuid4(), amount=booking.total_price)
+
+
+class PaymentTaskTests(FakeChapaTestCase):
+    def test_verify_payment_task_settles_the_payment(self):
+        payment = self.pending_payment()
+        self.assertEqual(verify_payment_task.delay(str(payment.tx_ref)).get(), 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PaymentStatus.SUCCESS)
+        self.assertEqual(payment.booking.status, BookingStatus.CONFIRMED)
+        stats = ListingMonthlyStats.objects.get(
+            listing=self.listing, month=date(2030, 1, 1))
+        self.assertEqual(stats.revenue, Decimal('200.00'))
+
+    def test_verify_payment_task_leaves_final_statuses_alone(self):
+        payment = self.pending_payment()
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.PaymentStatus.FAILED)
+        self.assertEqual(verify_payment_task.delay(str(payment.tx_ref)).get(), 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PaymentStatus.FAILED)
+
+    def test_reconcile_pending_payments_in_batches(self):
+        payments = [self.pending_payment(date(2030, 1, 1) + timedelta(days=3 * i))
+                    for i in range(5)]
+        self.chapa.httpd.verify_status = 'failed/cancelled'
+        updated = reconcile_pending_payments.delay(
+            batch_size=2, concurrency=2).get()
+        self.assertEqual(updated, 5)
+        self.assertEqual(
+            set(Payment.objects.filter(pk__in=[p.pk for p in payments])
+                .values_list('status', flat=True)),
+            {Payment.PaymentStatus.FAILED})
+
+    @override_settings(CHAPA_MAX_RETRIES=0)
+    def test_reconcile_skips_payments_while_chapa_is_down(self):
+        payment = self.pending_payment()
+        self.chapa.set_down()
+        self.assertEqual(reconcile_pending_payments.delay().get(), 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PaymentStatus.PENDING)
+
+    def test_async_verify_returns_202_and_queues_the_task(self):
+        payment = self.pending_payment()
+        self.client.force_authenticate(self.guest)
+        response = self.client.get(
+            f'/api/payments/verify/{payment.tx_ref}/?async=true')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        # The eager task has already run
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PaymentStatus.SUCCESS)
+
+
+class ChapaClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.chapa = FakeChapaServer().start()
+        cls.addClassCleanup(cls.chapa.stop)
+
+    def setUp(self):
+        self.chapa.set_down(False)
+
+    def chapa_client(self, client_class=ChapaClient, base_url=None, **kwargs):
+        kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=100))
+        return client_class(
+            'test-key', base_url or self.chapa.base_url, backoff=0, **kwargs)
+
+    def requests_during(self, call):
+        before = self.chapa.requests
+        try:
+            call()
+        finally:
+            self.sent = self.chapa.requests - before
+        return self.sent
+
+    def test_verify_returns_the_provider_response(self):
+        tx_ref = uuid.uuid4()
+        response = self.chapa_client().verify(tx_ref)
+        self.assertEqual(response['data'], {
+            'tx_ref': str(tx_ref), 'status': 'success'})
+
+    def test_verify_is_retried_during_an_outage(self):
+        self.chapa.set_down()
+        client = self.chapa_client(max_retries=2)
+        with self.assertRaisesMessage(ChapaUnavailable, "returned 503"):
+            self.requests_during(lambda: client.verify(uuid.uuid4()))
+        self.assertEqual(self.sent, 3)
+
+    def test_initialize_is_not_retried(self):
+        self.chapa.set_down()
+        client = self.chapa_client(max_retries=2)
+        with self.assertRaises(ChapaUnavailable):
+            self.requests_during(lambda: client.initialize({'amount': '10'}))
+        self.assertEqual(self.sent, 1)
+
+    def test_read_timeout_counts_as_unavailable(self):
+        with FakeChapaServer(latency=0.3) as slow:
+            client = self.chapa_client(
+                base_url=slow.base_url, read_timeout=0.05, max_retries=1)
+            with self.assertRaises(ChapaUnavailable):
+                client.verify(uuid.uuid4())
+            self.assertEqual(slow.requests, 2)
+
+    def test_open_circuit_fails_fast(self):
+        self.chapa.set_down()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        client = self.chapa_client(max_retries=0, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(ChapaUnavailable):
+                client.verify(uuid.uuid4())
+        self.assertTrue(breaker.is_open)
+
+        self.chapa.set_down(False)
+        with self.assertRaisesMessage(ChapaUnavailable, "circuit is open"):
+            self.requests_during(lambda: client.verify(uuid.uuid4()))
+        self.assertEqual(self.sent, 0)
+
+    def test_half_open_circuit_lets_one_trial_through(self):
+        self.chapa.set_down()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        client = self.chapa_client(max_retries=0, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(ChapaUnavailable):
+                client.verify(uuid.uuid4())
+
+        # A failed trial opens the circuit again at once
+        time.sleep(0.06)
+        with self.assertRaisesMessage(ChapaUnavailable, "returned 503"):
+            self.requests_during(lambda: client.verify(uuid.uuid4()))
+        self.assertEqual(self.sent, 1)
+        self.assertTrue(breaker.is_open)
+
+        # A successful one closes it
+        self.chapa.set_down(False)
+        time.sleep(0.06)
+        client.verify(uuid.uuid4())
+        self.assertFalse(breaker.is_open)
+
+    def test_half_open_circuit_rejects_others_during_the_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        with FakeChapaServer(latency=0.2) as slow:
+            client = self.chapa_client(
+                base_url=slow.base_url, max_retries=0, breaker=breaker)
+
+            def verify(_):
+                try:
+                    client.verify(uuid.uuid4())
+                    return 'ok'
+                except ChapaUnavailable:
+                    return 'rejected'
+
+            with ThreadPoolExecutor(8) as pool:
+                outcomes = sorted(pool.map(verify, range(8)))
+            self.assertEqual(outcomes, ['ok'] + ['rejected'] * 7)
+            self.assertEqual(slow.requests, 1)
+        self.assertFalse(breaker.is_open)
+
+    def test_async_client_retries_and_shares_the_breaker(self):
+        self.chapa.set_down()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+        async def verify():
+            client = self.chapa_client(
+                AsyncChapaClient, max_retries=2, breaker=breaker)
+            return await client.verify(uuid.uuid4())
+
+        with self.assertRaisesMessage(ChapaUnavailable, "returned 503"):
+            self.requests_during(lambda: asyncio.run(verify()))
+        self.assertEqual(self.sent, 3)
+        self.assertTrue(breaker.is_open)
+        with self.assertRaisesMessage(ChapaUnavailable, "circuit is open"):
+            self.chapa_client(max_retries=0, breaker=breaker).verify(uuid.uuid4())
+
+
+@skipIf(orjson is None, 'orjson is not installed')
+class ORJSONTests(SimpleTestCase):
+    def parse(self, parser, body):
+        try:
+            return parser.parse(io.BytesIO(body), 'application/json', {})
+        except ParseError as exc:
+            return f'ParseError: {exc.detail}'
+
+    def test_renders_the_same_bytes_as_drf(self):
+        for name, data in COMPATIBILITY_CASES.items():
+            with self.subTest(name):
+                self.assertEqual(ORJSONRenderer().render(data),
+                                 JSONRenderer().render(data))
+
+    def test_parses_the_same_values_as_drf(self):
+        for body in PARSE_CASES:
+            with self.subTest(body):
+                self.assertEqual(repr(self.parse(ORJSONParser(), body)),
+                                 repr(self.parse(JSONParser(), body)))
+
+    def test_indented_output_falls_back_to_json(self):
+        data = {'name': 'Lake view', 'nights': [1, 2]}
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.guest = User.objects.create_user(
+            username='guest', password='pass', role='guest',
+            first_name='Abebe', last_name='Bikila')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+
+    def authenticate(self, user):
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def book(self):
+        return self.client.post('/api/bookings', {
+            'listing': str(self.listing.pk),
+            'start_date': '2030-01-01',
+            'end_date': '2030-01-03',
+        }, format='json')
+
+    def test_created_review_renders_the_author_names(self):
+        self.authenticate(self.guest)
+        response = self.client.post('/api/reviews', {
+            'listing': str(self.listing.pk), 'rating': 5, 'comment': 'Great',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user'], {
+            'user_id': str(self.guest.pk),
+            'first_name': 'Abebe',
+            'last_name': 'Bikila',
+        })
+
+    def test_role_change_revokes_issued_tokens(self):
+        self.authenticate(self.guest)
+        self.guest.role = 'host'
+        self.guest.save()
+        self.assertEqual(self.book().status_code, 401)
+        self.authenticate(self.guest)
+        self.assertEqual(self.book().status_code, 403)
+
+    def test_other_changes_keep_tokens_valid(self):
+        self.authenticate(self.guest)
+        self.guest.first_name = 'Haile'
+        self.guest.save()
+        self.guest.is_staff = False
+        self.guest.save(update_fields=['is_staff'])
+        self.assertEqual(self.book().status_code, 201)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username='admin', password='pass', role='admin')
+        listing = Listing.objects.create(
+            host=admin, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        Booking.objects.create(
+            listing=listing, user=admin, total_price=300,
+            start_date=date(2030, 1, 1), end_date=date(2030, 1, 4))
+        self.client.force_authenticate(admin)
+
+    def export(self, file_format):
+        response = self.client.get(f'/api/exports/bookings.{file_format}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_formats_write_the_same_values(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        objects = [json.loads(line)
+                   for line in self.export('ndjson').splitlines()]
+        self.assertEqual(rows, [
+            {name: str(value) for name, value in row.items()}
+            for row in objects])
+        self.assertRegex(rows[0]['created_at'],
+                         r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{3})?Z$')
+
+
+class ListingReviewFeedTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        Review.objects.create(
+            listing=self.listing, user=host, rating=5, comment='great')
+
+    def test_reviews_of_a_listing(self):
+        response = self.client.get(f'/api/listings/{self.listing.pk}/reviews')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [review['comment'] for review in response.json()['results']],
+            ['great'])
+
+    def test_unknown_or_malformed_listing_is_not_found(self):
+        for pk in (uuid.uuid4(), 'nope'):
+            response = self.client.get(f'/api/listings/{pk}/reviews')
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CHAPA_WEBHOOK_SECRET='webhook-secret')
+class ChapaWebhookTests(APITestCase):
+    url = '/api/payments/webhook/'
+
+    def post(self, body, signature=None):
+        if signature is None:
+            signature = hmac.new(
+                b'webhook-secret', body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            self.url, body, content_type='application/json',
+            HTTP_X_CHAPA_SIGNATURE=signature)
+
+    def test_event_is_recorded_once(self):
+        tx_ref = uuid.uuid4()
+        body = json.dumps({'tx_ref': str(tx_ref), 'status': 'success'}).encode()
+        self.assertEqual(self.post(body).status_code, 200)
+        self.assertEqual(self.post(body).status_code, 200)
+        self.assertEqual(
+            list(PaymentEvent.objects.values_list('tx_ref', 'status')),
+            [(tx_ref, 'success')])
+
+    def test_bad_signature_is_refused(self):
+        body = json.dumps({'tx_ref': str(uuid.uuid4()), 'status': 'success'})
+        self.assertEqual(
+            self.post(body.encode(), signature='0' * 64).status_code, 401)
+
+    def test_payload_that_is_not_an_object_is_rejected(self):
+        for body in (b'[1]', b'"success"', b'3'):
+            self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.guest = User.objects.create_user(
+            username='guest', password='pass', role='guest')
+        self.listing = Listing.objects.create(
+            host=host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        rates = override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_THROTTLE_RATES': {
+                **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+                'bookings': '2/min',
+            },
+        })
+        rates.enable()
+        self.addCleanup(rates.disable)
+
+    def test_booking_burst_is_refused_with_retry_after(self):
+        self.client.force_authenticate(self.guest)
+        codes = []
+        for day in range(1, 4):
+            codes.append(self.client.post('/api/bookings', {
+                'listing': str(self.listing.pk),
+                'start_date': f'2030-01-0{day}',
+                'end_date': f'2030-01-0{day + 1}',
+            }, format='json'))
+        self.assertEqual([r.status_code for r in codes], [201, 201, 429])
+        self.assertEqual(codes[-1]['Retry-After'], '30')
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        for i in range(5):
+            Listing.objects.create(
+                host=host, name=f'Listing {i}', description='d',
+                location='Addis Ababa', price_per_night=100 + i)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_match_the_drf_route_in_both_directions(self):
+        first = self.get('/api/async/listings?page_size=2')
+        self.assertEqual(set(first), {'next', 'previous', 'results'})
+        self.assertIsNone(first['previous'])
+        second = self.get(first['next'])
+        third = self.get(second['next'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(self.get(third['previous']), second)
+        self.assertEqual(self.get(second['previous'])['results'],
+                         first['results'])
+
+        expected = self.get('/api/listings?page_size=2')
+        self.assertEqual(first['results'], expected['results'])
+        self.assertEqual(second['results'],
+                         self.get(expected['next'])['results'])
+
+    def test_sparse_fieldsets(self):
+        for query in ('fields=listing_id,name', 'omit=description'):
+            self.assertEqual(
+                self.get(f'/api/async/listings?{query}')['results'],
+                self.get(f'/api/listings?{query}')['results'])
+        response = self.client.get('/api/async/listings?fields=bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'fields': ['Unknown field(s): bogus']})
+
+    def test_retry_after_is_rounded_up(self):
+        with override_settings(REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                'DEFAULT_THROTTLE_RATES': {
+                    **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+                    'listings_anon': '2/min',
+                }}):
+            # An address of its own, so the bucket starts full
+            codes = [self.client.get('/api/async/listings',
+                                     REMOTE_ADDR='203.0.113.21')
+                     for _ in range(3)]
+        self.assertEqual([r.status_code for r in codes], [200, 200, 429])
+        self.assertEqual(codes[-1]['Retry-After'], '30')
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def scrape(self, **headers):
+        return self.client.get('/metrics', headers=headers).status_code
+
+    @override_settings(METRICS_AUTH_TOKEN='', DEBUG=False)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.scrape(), 404)
+
+    @override_settings(METRICS_AUTH_TOKEN='', DEBUG=True)
+    def test_open_in_debug_without_a_token(self):
+        self.assertEqual(self.scrape(), 200)
+
+    @override_settings(METRICS_AUTH_TOKEN='s3cret', DEBUG=False)
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.scrape(), 403)
+        self.assertEqual(self.scrape(Authorization='Bearer nope'), 403)
+        self.assertEqual(self.scrape(Authorization='Bearer s3cret'), 200)
+
+
+class ListingCacheTests(APITestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(
+            username='host', password='pass', role='host')
+        self.listing = Listing.objects.create(
+            host=self.host, name='Lake view', description='d',
+            location='Addis Ababa', price_per_night=100)
+        self.url = f'/api/listings/{self.listing.pk}'
+
+    def rebuild(self, command):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(command, stdout=io.StringIO())
+
+    def test_rebuilt_ratings_expire_cached_listing_reads(self):
+        self.assertEqual(self.client.get(self.url).json()['review_count'], 0)
+        # Written around Review.save, as by an import or a repair script
+        Review.objects.bulk_create([Review(
+            listing=self.listing, user=self.host, rating=4, comment='ok')])
+        self.assertEqual(self.client.get(self.url).json()['review_count'], 0)
+        self.rebuild('rebuild_ratings')
+        self.assertEqual(self.client.get(self.url).json()['review_count'], 1)
+
+    def test_rebuilt_calendar_expires_cached_calendars(self):
+        url = f'{self.url}/calendar?from=2030-01-01&to=2030-01-01'
+        booking = Booking.objects.create(
+            listing=self.listing, user=self.host, total_price=0,
+            start_date=date(2030, 1, 1), end_date=date(2030, 1, 2))
+        self.assertFalse(self.client.get(url).json()['nights'][0]['available'])
+        # Cancelled around Booking.save, so the calendar still holds it
+        Booking.objects.filter(pk=booking.pk).update(
+            status=BookingStatus.CANCELLED)
+        self.rebuild('rebuild_calendar')
+        self.assertTrue(self.client.get(url).json()['nights'][0]['available'])
+
+    def test_default_calendar_moves_on_at_midnight(self):
+        today = date.today()
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return today + timedelta(days=1)
+
+        url = f'{self.url}/calendar'
+        response = self.client.get(url)
+        self.assertEqual(response.json()['from'], today.isoformat())
+        with mock.patch('listings.views.date', Tomorrow), \
+                mock.patch('listings.cache.date', Tomorrow):
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                .status_code, 200)
+            self.assertEqual(self.client.get(url).json()['from'],
+                             (today + timedelta(days=1)).isoformat())
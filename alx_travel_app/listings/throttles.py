@@ -0,0 +1,100 @@
+"""
+Token-bucket throttles kept in the shared cache.
+
+A rate such as "20/min" in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+gives every client a bucket of 20 tokens that refills one token every
+3 seconds. The bucket is tracked with the generic cell rate algorithm:
+the cache holds the theoretical arrival time (TAT) of the client's next
+request, in microseconds, and each request moves it one refill interval
+forward with a single atomic `incr`. Workers sharing the cache therefore
+never lose each other's updates. A request that would push the TAT more
+than a full bucket past now is refused, and `wait()` reports when the
+next token frees up for the Retry-After header.
+
+Unlike DRF's own throttles, no per-request history is read back and
+rewritten, so the cost is one or two cache round trips whatever the rate.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
+from .metrics import THROTTLED_REQUESTS
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Allow bursts of `num_requests` and refill them over `duration`.
+    """
+
+    # Idle buckets are dropped after this long. A bucket idle for a full
+    # refill period is full again, so its state is not needed any more.
+    cache_timeout = 60 * 60
+
+    def get_rate(self):
+        # Read the live settings rather than DRF's import-time copy
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"No default throttle rate set for '{self.scope}' scope")
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        interval = self.duration * 1_000_000 // self.num_requests
+        now = int(self.timer() * 1_000_000)
+        try:
+            tat = self.cache.incr(key, interval)
+        except ValueError:
+            if self.cache.add(key, now + interval, self.cache_timeout):
+                return True
+            tat = self.cache.incr(key, interval)
+
+        if tat - interval < now:
+            # The bucket had refilled; restart the schedule from now
+            self.cache.set(key, now + interval, self.cache_timeout)
+            return True
+        excess = tat - now - self.num_requests * interval
+        if excess > 0:
+            # Hand back the token this request did not get
+            self.cache.decr(key, interval)
+            self.retry_after = excess / 1_000_000
+            THROTTLED_REQUESTS.labels(self.scope).inc()
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle, UserRateThrottle):
+    """
+    One bucket per user, or per client IP for anonymous requests.
+    """
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle, AnonRateThrottle):
+    """
+    One bucket per client IP; authenticated requests are not throttled.
+    """
+
+
+class BookingCreateThrottle(UserTokenBucketThrottle):
+    scope = 'bookings'
+
+
+class PaymentInitiateThrottle(UserTokenBucketThrottle):
+    scope = 'payments_initiate'
+
+
+class PaymentVerifyThrottle(UserTokenBucketThrottle):
+    scope = 'payments_verify'
+
+
+class ListingAnonReadThrottle(AnonTokenBucketThrottle):
+    scope = 'listings_anon'
+
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSets, BookingViewSets, ReviewViewSets, initiate_payment, verify_payment
+from . import async_views
+from .views import ListingViewSets, BookingViewSets, ReviewViewSets, initiate_payment, verify_payment, chapa_webhook, listing_cache_stats, request_metrics, host_stats, export_rows
 
 router = DefaultRouter(trailing_slash=False)
 router.register(r'listings', ListingViewSets, basename='listings')
@@ -10,5 +11,20 @@ router.register(r'reviews', ReviewViewSets, basename='reviews')
 urlpatterns = [
     path('', include(router.urls)),
     path('payments/initiate/', view=initiate_payment),
-    path('payments/verify/<uuid:tx_ref>/', view=verify_payment)
+    path('payments/verify/<uuid:tx_ref>/', view=verify_payment),
+    path('payments/webhook/', view=chapa_webhook),
+    path('cache/stats/', view=listing_cache_stats),
+    path('host/stats/', view=host_stats),
+    path('exports/<str:dataset>.<str:file_format>', view=export_rows),
+    path('metrics/requests/', view=request_metrics),
+
+    # Async-native counterparts for ASGI deployments
+    path('async/listings', view=async_views.listing_list),
+    path('async/listings/<uuid:listing_id>', view=async_views.listing_detail),
+    path('async/bookings', view=async_views.booking_list),
+    path('async/bookings/<uuid:booking_id>', view=async_views.booking_detail),
+    path('async/reviews', view=async_views.review_list),
+    path('async/reviews/<uuid:review_id>', view=async_views.review_detail),
+    path('async/payments/initiate/', view=async_views.initiate_payment),
+    path('async/payments/verify/<uuid:tx_ref>/', view=async_views.verify_payment),
 ]
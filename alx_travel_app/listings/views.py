@@ -1,23 +1,305 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from .serializers import UserSerializer, BookingSerializer, ListingSerializer, PaymentSerializer
-from .models import User, Booking, Listing, Review, Payment
-from .permissions import IsGuestForBooking, IsHostForListing
-import requests
-import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from .serializers import BookingSerializer, BulkBookingItemSerializer, DateRangeSerializer, ListingSerializer, ListingSummarySerializer, ListingSearchSerializer, ListingMonthlyStatsSerializer, NearbySearchSerializer, ListingPricingSerializer, QuoteQuerySerializer, QuoteSerializer, ReviewerSerializer, ReviewSerializer, PaymentSerializer, validate_items
+from .models import BookedNight, Booking, BookingStatus, Listing, ListingMonthlyStats, Review, Payment, PaymentEvent, User, booking_rollup, merge_rollups, month_start, next_month
+from .permissions import IsAdminRole, IsGuestForBooking, IsHost, IsHostForListing, IsReviewOwner
+from .pagination import ListingCursorPagination, ReviewCursorPagination, SearchPagination
+from .search import full_text_search, index_listings
+from .geo import within_radius
+from .fieldsets import SparseFieldsetMixin, parse_fieldset
+from .throttles import BookingCreateThrottle, ListingAnonReadThrottle, PaymentInitiateThrottle, PaymentVerifyThrottle
+from .chapa import get_client, transaction_status, webhook_status, verify_webhook_signature, ChapaUnavailable, ChapaBadResponse
+from .tasks import apply_payment_statuses, verify_payment_task
+from .cache import cached_listing_read, cache_stats, invalidate_listings
+from .middleware import request_stats
+from .exports import EXPORTS, FORMATS, gzip_chunks, row_chunks
+from .metrics import BOOKINGS_CREATED, BOOKING_CONFLICTS, PAYMENT_INITIATIONS, PAYMENT_VERIFICATIONS
 import uuid
-import alx_travel_app.settings as settings
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 
 
-CHAPA_SECRET_KEY = settings.env('CHAPA_SECRET_KEY')
+def parse_listing_id(pk):
+    """
+    Return the listing UUID from the URL, or 404 if it is malformed.
+    """
+    try:
+        return uuid.UUID(pk)
+    except ValueError:
+        raise NotFound()
+
+
+def bulk_items(request):
+    """
+    Return the array body of a bulk request.
+    """
+    items = request.data
+    if not isinstance(items, list):
+        raise ValidationError({"non_field_errors": ["expected a list of items"]})
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise ValidationError({"non_field_errors": [
+            f"at most {settings.BULK_MAX_ITEMS} items per request"]})
+    return items
 
 
-class ListingViewSets(viewsets.ModelViewSet):
+def bulk_response(count, created, errors, pk_name):
+    """
+    Report the outcome of every item of a bulk request, in request order.
+
+    201 if all items were created, 207 if only some were, 400 otherwise.
+    """
+    results = []
+    for index in range(count):
+        if index in created:
+            results.append({
+                'index': index, 'status': 'created',
+                pk_name: created[index].pk})
+        else:
+            results.append({
+                'index': index, 'status': 'error',
+                'errors': errors[index]})
+    if not errors:
+        code = status.HTTP_201_CREATED
+    elif created:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return Response({
+        'created': len(created),
+        'failed': len(errors),
+        'results': results,
+    }, status=code)
+
+
+class ListingViewSets(SparseFieldsetMixin, viewsets.ModelViewSet):
+    """
+    Viewsets for the Listings model
+
+    The list route is cursor-paginated and renders the compact
+    representation; bookings are only nested on the detail route
+    or when requested with `?expand=bookings`. Reads accept
+    `?fields=` and `?omit=`. Anonymous reads are throttled per IP.
+    """
+
     serializer_class = ListingSerializer
     queryset = Listing.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsHostForListing]
+    pagination_class = ListingCursorPagination
+    render_from_values = True
+
+    def expand_bookings(self):
+        """
+        Return True if the response should nest the listing bookings.
+        """
+        if self.action not in ('list', 'search', 'nearby'):
+            return True
+        expand = self.request.query_params.get('expand', '')
+        return 'bookings' in expand.split(',')
+
+    def get_throttles(self):
+        if self.request.method in SAFE_METHODS:
+            return [ListingAnonReadThrottle()]
+        return super().get_throttles()
+
+    @cached_listing_read()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_listing_read(per_listing=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        if self.expand_bookings():
+            return ListingSerializer
+        return ListingSummarySerializer
+
+    def get_queryset(self):
+        """
+        Only prefetch bookings when they are rendered.
+        """
+        queryset = Listing.objects.all()
+        if self.expand_bookings() and 'bookings' in (
+                self.get_fieldset() or ['bookings']):
+            queryset = queryset.prefetch_related('bookings')
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    @cached_listing_read()
+    def search(self, request):
+        """
+        Search listings by keywords, location, nightly price range and an
+        open date window, e.g.
+        `?location=Addis Ababa&max_price=200&check_in=2025-06-03&check_out=2025-06-09`
+
+        Listings with a booked night in the window are removed with a
+        single NOT EXISTS anti-join on the availability calendar. With
+        `?q=` the full-text matches are ranked by relevance and
+        paginated by page number.
+        """
+        params = ListingSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'location' in filters:
+            queryset = queryset.filter(location=filters['location'])
+        if 'min_price' in filters:
+            queryset = queryset.filter(
+                price_per_night__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(
+                price_per_night__lte=filters['max_price'])
+        if 'check_in' in filters:
+            taken = BookedNight.objects.filter(
+                listing=OuterRef('pk')).between(
+                filters['check_in'], filters['check_out'])
+            queryset = queryset.filter(~Exists(taken))
+
+        if 'q' in filters:
+            # Relevance order replaces the cursor's creation order
+            queryset = full_text_search(queryset, filters['q'])
+            paginator = SearchPagination()
+        else:
+            paginator = self.paginator
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        data = serializer.data
+        if 'check_in' in filters:
+            # Quote the whole page with one batch of rate card queries
+            stay = filters['check_in'], filters['check_out']
+            cards = Listing.rate_cards([listing.pk for listing in page], *stay)
+            for listing, item in zip(page, data):
+                item['quote'] = QuoteSerializer(
+                    cards[listing.pk].quote(*stay)).data
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'])
+    @cached_listing_read()
+    def nearby(self, request):
+        """
+        Listings within `radius` km of a point, nearest first, e.g.
+        `?lat=9.03&lng=38.74&radius=5`
+
+        Candidates are narrowed with range scans on the geocell index
+        before the exact distance is computed. Each result carries its
+        `distance_km`.
+        """
+        params = NearbySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        point = params.validated_data
+
+        queryset = within_radius(
+            self.filter_queryset(self.get_queryset()), point['lat'], point['lng'], point['radius'])
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        data = self.get_serializer(page, many=True).data
+        for listing, item in zip(page, data):
+            item['distance_km'] = round(listing.distance_km, 3)
+        return paginator.get_paginated_response(data)
+
+    @action(detail=True, methods=['get', 'put', 'patch'])
+    def pricing(self, request, pk=None):
+        """
+        Read or replace the rate card of a listing: base and weekend
+        rates, cleaning fee, seasonal rates and length-of-stay discounts.
+        """
+        listing = get_object_or_404(
+            Listing.objects.prefetch_related('seasonal_rates', 'stay_discounts'),
+            pk=parse_listing_id(pk))
+        self.check_object_permissions(request, listing)
+        if request.method == 'GET':
+            return Response(ListingPricingSerializer(listing).data)
+
+        serializer = ListingPricingSerializer(
+            listing, data=request.data, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        listing = Listing.objects.prefetch_related(
+            'seasonal_rates', 'stay_discounts').get(pk=listing.pk)
+        return Response(ListingPricingSerializer(listing).data)
+
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """
+        Price a stay, e.g. `?check_in=2025-06-03&check_out=2025-06-09`
+        """
+        params = QuoteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        stay = (params.validated_data['check_in'],
+                params.validated_data['check_out'])
+        listing_id = parse_listing_id(pk)
+        card = Listing.rate_cards([listing_id], *stay).get(listing_id)
+        if card is None:
+            raise NotFound()
+        return Response(QuoteSerializer(card.quote(*stay)).data)
+
+    @action(detail=True, methods=['get'])
+    # Without `from` the range starts today
+    @cached_listing_read(per_listing=True, daily=True)
+    def calendar(self, request, pk=None):
+        """
+        Availability and rate of a listing per night, e.g.
+        `?from=2025-06-01&to=2025-06-30` (both inclusive, default: the
+        next 30 nights). Read from the availability calendar with one
+        indexed range query.
+        """
+        params = DateRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        first = params.validated_data.get('from', date.today())
+        last = params.validated_data.get('to', first + timedelta(days=29))
+        nights = (last - first).days + 1
+        if nights > settings.CALENDAR_MAX_NIGHTS:
+            raise ValidationError({"non_field_errors": [
+                f"at most {settings.CALENDAR_MAX_NIGHTS} nights per request"]})
+
+        listing_id = parse_listing_id(pk)
+        end = last + timedelta(days=1)
+        card = Listing.rate_cards([listing_id], first, end).get(listing_id)
+        if card is None:
+            raise NotFound()
+        taken = set(BookedNight.objects.filter(listing_id=listing_id)
+                    .between(first, end).values_list('night', flat=True))
+
+        calendar = []
+        for offset in range(nights):
+            night = first + timedelta(days=offset)
+            calendar.append({
+                'date': night,
+                'available': night not in taken,
+                'price': f"{card.night_price(night):.2f}",
+            })
+        return Response({
+            'listing_id': listing_id,
+            'from': first,
+            'to': last,
+            'nights': calendar,
+        })
+
+    @action(detail=True, methods=['get'])
+    @cached_listing_read(per_listing=True)
+    def reviews(self, request, pk=None):
+        """
+        Cursor-paginated reviews of a single listing, newest first.
+        """
+        listing = get_object_or_404(
+            Listing.objects.only('pk'), pk=parse_listing_id(pk))
+        paginator = ReviewCursorPagination()
+        page = paginator.paginate_queryset(
+            review_queryset().filter(listing=listing), request, view=self)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         """
@@ -25,8 +307,28 @@ class ListingViewSets(viewsets.ModelViewSet):
         """
         serializer.save(host=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create up to BULK_MAX_ITEMS listings owned by the logged-in user
+        with one INSERT. Invalid items are reported and skipped.
+        """
+        items = bulk_items(request)
+        valid, errors = validate_items(ListingSummarySerializer, items)
+        created = {
+            index: Listing(host_id=request.user.pk, **data)
+            for index, data in valid.items()}
+        for listing in created.values():
+            listing.set_geocell()
+        with transaction.atomic():
+            Listing.objects.bulk_create(created.values())
+            if created:
+                invalidate_listings()
+                index_listings(created.values())
+        return bulk_response(len(items), created, errors, 'listing_id')
 
-class BookingViewSets(viewsets.ModelViewSet):
+
+class BookingViewSets(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     Viewsets for the Bookings model
     """
@@ -34,12 +336,107 @@ class BookingViewSets(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     queryset = Booking.objects.all()
     permission_classes = [IsAuthenticated, IsGuestForBooking]
+    render_from_values = True
+    required_columns = ('user',)
+
+    def get_throttles(self):
+        if self.action in ('create', 'bulk'):
+            return [BookingCreateThrottle()]
+        return super().get_throttles()
 
     def perform_create(self, serializer):
         """
         Assign booking to logged-in user
         """
-        serializer.save(user=self.request.user)
+        try:
+            serializer.save(user=self.request.user)
+        except ValidationError:
+            BOOKING_CONFLICTS.inc()
+            raise
+        BOOKINGS_CREATED.inc()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Book up to BULK_MAX_ITEMS stays for the logged-in user.
+
+        Referenced listings are locked and their rate cards loaded with a
+        fixed number of queries. Overlaps are checked within the batch in
+        memory and against the availability calendar with one more query.
+        Valid items are inserted in bulk; the others are reported and
+        skipped.
+        """
+        items = bulk_items(request)
+        valid, errors = validate_items(BulkBookingItemSerializer, items)
+
+        with transaction.atomic():
+            # Same lock as a single booking, taken in a stable order
+            listing_ids = list(Listing.objects.select_for_update()
+                               .filter(pk__in={d['listing'] for d in valid.values()})
+                               .order_by('pk')
+                               .values_list('pk', flat=True))
+            cards = Listing.rate_cards(listing_ids)
+
+            accepted, conflicts = {}, 0
+            for index, data in valid.items():
+                if data['listing'] not in cards:
+                    errors[index] = {"listing": [
+                        f'Invalid pk "{data["listing"]}" - object does not exist.']}
+                elif data['status'] != BookingStatus.CANCELLED and any(
+                        other['listing'] == data['listing']
+                        and other['status'] != BookingStatus.CANCELLED
+                        and other['start_date'] < data['end_date']
+                        and other['end_date'] > data['start_date']
+                        for other in accepted.values()):
+                    errors[index] = {"non_field_errors": [
+                        "overlaps another booking in this request"]}
+                    conflicts += 1
+                else:
+                    accepted[index] = data
+
+            active = {i: d for i, d in accepted.items()
+                      if d['status'] != BookingStatus.CANCELLED}
+            if active:
+                stays = Q()
+                for data in active.values():
+                    stays |= Q(listing_id=data['listing'],
+                               night__gte=data['start_date'],
+                               night__lt=data['end_date'])
+                taken = {}
+                for listing_id, night in BookedNight.objects.filter(
+                        stays).values_list('listing_id', 'night'):
+                    taken.setdefault(listing_id, []).append(night)
+                for index, data in active.items():
+                    if any(data['start_date'] <= night < data['end_date']
+                           for night in taken.get(data['listing'], ())):
+                        errors[index] = {"non_field_errors": [
+                            "listing is not available for these dates"]}
+                        del accepted[index]
+                        conflicts += 1
+
+            created = {
+                index: Booking(
+                    listing_id=data['listing'],
+                    user_id=request.user.pk,
+                    start_date=data['start_date'],
+                    end_date=data['end_date'],
+                    status=data['status'],
+                    total_price=cards[data['listing']].quote(
+                        data['start_date'], data['end_date'])['total'])
+                for index, data in sorted(accepted.items())}
+            # bulk_create skips Booking.save, so fill the calendar and
+            # roll up here
+            Booking.objects.bulk_create(created.values())
+            BookedNight.reserve(created.values())
+            ListingMonthlyStats.apply(merge_rollups(*(
+                booking_rollup(b.listing_id, b.start_date, b.end_date, b.status)
+                for b in created.values())))
+            if created:
+                invalidate_listings([b.listing_id for b in created.values()])
+
+        BOOKINGS_CREATED.inc(len(created))
+        BOOKING_CONFLICTS.inc(conflicts)
+        return bulk_response(len(items), created, errors, 'booking_id')
 
     def get_queryset(self):
         """
@@ -53,17 +450,48 @@ class BookingViewSets(viewsets.ModelViewSet):
         return Booking.objects.none()
 
 
-class ReviewViewSets(viewsets.ModelViewSet):
-    serializer_class = UserSerializer
-    queryset = Review.objects.all()
-    permission_classes = [IsAuthenticatedOrReadOnly]
+def review_queryset():
+    """
+    Reviews with their author, loading only the fields that are rendered.
+    """
+    return Review.objects.select_related('user').only(
+        'review_id',
+        'listing_id',
+        'rating',
+        'comment',
+        'created_at',
+        'user__user_id',
+        'user__first_name',
+        'user__last_name',
+    )
+
+
+class ReviewViewSets(SparseFieldsetMixin, viewsets.ModelViewSet):
+    """
+    Viewsets for the Reviews model
+    """
+
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly, IsReviewOwner]
+    pagination_class = ReviewCursorPagination
+    render_from_values = True
+
+    def get_queryset(self):
+        return review_queryset()
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        """
+        Assign review to logged-in user
+        """
+        review = serializer.save(user=self.request.user)
+        # The token-built user has no names, so render the stored author
+        review.user = User.objects.only(
+            *ReviewerSerializer.Meta.fields).get(pk=review.user_id)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsGuestForBooking])
+@throttle_classes([PaymentInitiateThrottle])
 def initiate_payment(request, format=None):
     """Initiate Chapa checkout"""
     # Ensure booking_id is part of body
@@ -80,9 +508,6 @@ def initiate_payment(request, format=None):
         return Response({"error": "booking not found"},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    # Define parameters for API call
-    url = "https://api.chapa.co/v1/transaction/initialize"
-
     tx_ref = uuid.uuid4()
     amount = booking.total_price
 
@@ -91,26 +516,24 @@ def initiate_payment(request, format=None):
         "currency": "USD",
         "tx_ref": str(tx_ref),
     }
-    headers = {
-        "Authorization": f"Bearer {CHAPA_SECRET_KEY}",
-        "Content-Type": "application/json"
-    }
 
     # API call
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response_data = response.json()
-        print(response_data)
-    except requests.RequestException as exc:
+        response_data = get_client().initialize(payload)
+    except ChapaUnavailable:
+        PAYMENT_INITIATIONS.labels('unavailable').inc()
         return Response({"error": "payment provider unreachable"},
                         status=status.HTTP_503_SERVICE_UNAVAILABLE)
-    except ValueError:
+    except ChapaBadResponse:
+        PAYMENT_INITIATIONS.labels('bad_response').inc()
         return Response({"error": "invalid response from payment provider"},
                         status=status.HTTP_502_BAD_GATEWAY)
 
     # Catch request failure
     if response_data.get("status") == "failed":
+        PAYMENT_INITIATIONS.labels('rejected').inc()
         return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+    PAYMENT_INITIATIONS.labels('success').inc()
 
     # Save payment to database
     serializer = PaymentSerializer(data={
@@ -126,40 +549,204 @@ def initiate_payment(request, format=None):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsGuestForBooking])
+@throttle_classes([PaymentVerifyThrottle])
 def verify_payment(request, tx_ref, format=None):
-    """Verify Chapa payment"""
+    """
+    Verify Chapa payment
+
+    With `?async=true` the verification is queued on Celery and the
+    current payment is returned immediately with 202 Accepted.
+    `?fields=` and `?omit=` trim the rendered payment.
+    """
+    fields = parse_fieldset(
+        request.query_params, PaymentSerializer.Meta.fields)
     # Ensure tx_ref is valid
     try:
         payment = Payment.objects.get(tx_ref=tx_ref)
-    except Payment.DoesNotExist as e:
-        return Response(e.errors, status=status.HTTP_404_NOT_FOUND)
+    except Payment.DoesNotExist:
+        return Response({"error": "payment not found"},
+                        status=status.HTTP_404_NOT_FOUND)
 
-    # Declare parameters for API call
-    url = f"https://api.chapa.co/v1/transaction/verify/{tx_ref}"
-    headers = {
-        'Authorization': f'Bearer {CHAPA_SECRET_KEY}'
-    }
+    if request.query_params.get("async") in ("1", "true"):
+        if payment.status == Payment.PaymentStatus.PENDING:
+            verify_payment_task.delay(str(tx_ref))
+        serializer = PaymentSerializer(payment, fields=fields)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
     # Chapa API call
     try:
-        response = requests.get(url, headers=headers)
-        response_data = response.json()
-    except requests.RequestException as e:
+        response_data = get_client().verify(tx_ref)
+    except ChapaUnavailable:
+        PAYMENT_VERIFICATIONS.labels('unavailable').inc()
         return Response({"error": "payment provider unreachable"},
                         status=status.HTTP_503_SERVICE_UNAVAILABLE)
-    except ValueError:
+    except ChapaBadResponse:
+        PAYMENT_VERIFICATIONS.labels('bad_response').inc()
         return Response({"error": "invalid response from payment provider"},
                         status=status.HTTP_502_BAD_GATEWAY)
 
     if response_data.get("status") == "failed":
+        PAYMENT_VERIFICATIONS.labels('rejected').inc()
         return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
     # Update payment status
-    if response_data['data']["status"] == 'success':
-        payment.status = Payment.PaymentStatus.SUCCESS
-        payment.save()
-    elif response_data['data']["status"] == 'failed/cancelled':
-        payment.status = Payment.PaymentStatus.FAILED
-        payment.save()
-    serializer = PaymentSerializer(payment)
+    new_status = transaction_status(response_data)
+    PAYMENT_VERIFICATIONS.labels(new_status or 'pending').inc()
+    if apply_payment_statuses({payment.tx_ref: new_status}):
+        payment.refresh_from_db(fields=['status'])
+    serializer = PaymentSerializer(payment, fields=fields)
     return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+WEBHOOK_DEDUPE_TIMEOUT = 60 * 60 * 24
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def chapa_webhook(request, format=None):
+    """
+    Receive Chapa payment callbacks.
+
+    The body must carry a valid `x-chapa-signature`. Each (tx_ref, status)
+    transition is recorded once and applied later in batches by
+    `process_payment_events`; replays are acknowledged without any work.
+    """
+    signature = (request.headers.get("x-chapa-signature")
+                 or request.headers.get("chapa-signature"))
+    if not verify_webhook_signature(
+            request.body, signature, settings.CHAPA_WEBHOOK_SECRET):
+        return Response({"error": "invalid signature"},
+                        status=status.HTTP_401_UNAUTHORIZED)
+
+    if not isinstance(request.data, dict):
+        return Response({"error": "payload must be a JSON object"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    tx_ref = request.data.get("tx_ref")
+    new_status = webhook_status(request.data)
+    try:
+        tx_ref = uuid.UUID(str(tx_ref))
+    except ValueError:
+        return Response({"error": "invalid tx_ref"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if new_status is None:
+        return Response(status=status.HTTP_200_OK)
+
+    # Cheap replay check before touching the database
+    key = f"chapa-webhook:{tx_ref}:{new_status}"
+    if cache.add(key, 1, WEBHOOK_DEDUPE_TIMEOUT):
+        try:
+            PaymentEvent.objects.bulk_create(
+                [PaymentEvent(tx_ref=tx_ref, status=new_status)],
+                ignore_conflicts=True)
+        except Exception:
+            cache.delete(key)
+            raise
+    return Response(status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def listing_cache_stats(request, format=None):
+    """Hit/miss counters of the listing response cache"""
+    return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def request_metrics(request, format=None):
+    """Per-view timing and query aggregates of this worker"""
+    return Response(request_stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsHost])
+def host_stats(request, format=None):
+    """
+    Occupancy, revenue and booking counts per listing and month for the
+    logged-in host, read from the precomputed rollup.
+
+    `?from=&to=` select the months (default: the current year).
+    """
+    params = DateRangeSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    today = date.today()
+    first = month_start(params.validated_data.get('from', date(today.year, 1, 1)))
+    last = month_start(params.validated_data.get('to', date(today.year, 12, 1)))
+
+    rows = (ListingMonthlyStats.objects
+            .filter(listing__host_id=request.user.pk,
+                    month__gte=first, month__lte=last)
+            .select_related('listing')
+            .only('listing_id', 'listing__name', 'month', 'booked_nights',
+                  'booking_count', 'cancelled_count', 'revenue')
+            .order_by('listing__name', 'listing_id', 'month'))
+
+    days = (next_month(last) - first).days
+    listings = {}
+    totals = {'booked_nights': 0, 'booking_count': 0,
+              'cancelled_count': 0, 'revenue': Decimal(0)}
+    for row in rows:
+        entry = listings.setdefault(row.listing_id, {
+            'listing_id': row.listing_id,
+            'name': row.listing.name,
+            **{field: 0 for field in totals},
+            'months': [],
+        })
+        entry['months'].append(ListingMonthlyStatsSerializer(row).data)
+        for field in totals:
+            entry[field] += getattr(row, field)
+            totals[field] += getattr(row, field)
+
+    for entry in [totals, *listings.values()]:
+        # Match the serializer's decimal-as-string rendering
+        entry['revenue'] = f"{entry['revenue']:.2f}"
+    for entry in listings.values():
+        entry['occupancy_rate'] = round(entry['booked_nights'] / days, 4)
+    return Response({
+        'from': first,
+        'to': next_month(last) - timedelta(days=1),
+        'totals': totals,
+        'listings': list(listings.values()),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def export_rows(request, dataset, file_format):
+    """
+    Stream every booking or payment as CSV or NDJSON, e.g.
+    `/api/exports/payments.csv?from=2025-01-01&to=2025-03-31`
+
+    `from` and `to` filter on the creation date (inclusive). The body is
+    gzip-compressed on the fly when the client accepts it.
+    """
+    if dataset not in EXPORTS or file_format not in FORMATS:
+        raise NotFound()
+    params = DateRangeSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    model, fields = EXPORTS[dataset]
+    render, content_type = FORMATS[file_format]
+
+    # Datetime bounds keep the created_at filter sargable
+    queryset = model.objects.all()
+    if 'from' in params.validated_data:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(
+            datetime.combine(params.validated_data['from'], time.min)))
+    if 'to' in params.validated_data:
+        queryset = queryset.filter(created_at__lt=timezone.make_aware(
+            datetime.combine(params.validated_data['to'] + timedelta(days=1),
+                             time.min)))
+
+    chunks = render(fields, row_chunks(
+        queryset, fields, settings.EXPORT_CHUNK_SIZE))
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{dataset}.{file_format}"')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response